@@ -0,0 +1,241 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import http.client
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from . import miniyaml
+
+
+_default_url = 'https://forum.openra.net/openra/info/{fingerprint}'
+
+# Kinds of lookup failures: transient ones (network, server errors) are
+# retried soon, while the accounts rejected by the service (unknown
+# fingerprint, mismatch) are unlikely to ever become valid
+TRANSIENT = 'transient'
+INVALID = 'invalid'
+
+# Cap of the exponential backoff, in number of doublings of the retry delay
+_max_backoff = 10
+
+
+class AccountLookupError(Exception):
+
+    def __init__(self, reason, kind=TRANSIENT):
+        super().__init__(reason)
+        self.kind = kind
+
+
+class _RateLimiter:
+
+    def __init__(self, rate):
+        self._interval = 1 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            t = max(now, self._next)
+            self._next = t + self._interval
+        if t > now:
+            time.sleep(t - now)
+
+
+def _parse_account(fingerprint, player_yaml):
+    if not player_yaml:
+        raise AccountLookupError('Player info is empty')
+
+    player_info = miniyaml.load(player_yaml)
+    if 'Error' in player_info:
+        raise AccountLookupError(player_info['Error'], INVALID)
+
+    profile_fp = player_info['Player']['Fingerprint']
+    if profile_fp != fingerprint:
+        raise AccountLookupError(f"Player fingerprint doesn't match: {profile_fp} != {fingerprint}", INVALID)
+
+    profile_id = int(player_info['Player']['ProfileID'])
+    profile_name = player_info['Player']['ProfileName']
+    avatar = player_info['Player']['Avatar']
+    avatar_url = avatar['Src'] if avatar else ''
+
+    logging.info(f'{fingerprint}: {profile_name=} {profile_id=}')
+    return profile_id, profile_name, avatar_url
+
+
+class AccountResolver:
+    """Queries the OpenRA account service for the information on players.
+
+    The requests are made concurrently by `jobs` threads, each re-using its
+    own keep-alive connection, and are limited to `rate` requests per
+    second overall (no limit if 0).
+
+    Failed lookups are retried after `retry_delay` seconds for transient
+    errors, and `invalid_retry_delay` seconds for the accounts rejected by
+    the service (never if negative). The delay doubles with every
+    consecutive failure.
+    """
+
+    def __init__(self, url=_default_url, jobs=4, rate=5, timeout=10,
+                 retry_delay=600, invalid_retry_delay=7 * 24 * 3600):
+        url_parts = urlsplit(url)
+        if url_parts.scheme == 'https':
+            self._connection_cls = http.client.HTTPSConnection
+        else:
+            self._connection_cls = http.client.HTTPConnection
+        self._host = url_parts.netloc
+        self._path = url[url.index(url_parts.netloc) + len(url_parts.netloc):]
+        self._jobs = jobs
+        self._timeout = timeout
+        self._rate_limiter = _RateLimiter(rate)
+        self._retry_delays = {TRANSIENT: retry_delay, INVALID: invalid_retry_delay}
+        self._local = threading.local()
+
+    def _get_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connection_cls(self._host, timeout=self._timeout)
+            self._local.conn = conn
+        return conn
+
+    def _close_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _request(self, fingerprint):
+        path = self._path.format(fingerprint=fingerprint)
+        # A kept-alive connection may have been closed by the server in the
+        # meantime, in which case the request is made again on a new one
+        for attempt in range(2):
+            reused = getattr(self._local, 'conn', None) is not None
+            conn = self._get_connection()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._close_connection()
+                if not reused:
+                    raise
+                continue
+            except Exception:
+                self._close_connection()
+                raise
+            if response.status != 200:
+                raise Exception(f'HTTP error {response.status} {response.reason}')
+            return data
+        raise Exception('Connection closed by the server')
+
+    def _fetch_account(self, fingerprint):
+        """Returns an (account, error) tuple, one of them being None."""
+        self._rate_limiter.wait()
+        try:
+            player_yaml = self._request(fingerprint)
+        except Exception as e:
+            logging.error(f'Failed to fetch player info with {fingerprint=}: {e}')
+            return None, AccountLookupError(str(e))
+        try:
+            return _parse_account(fingerprint, player_yaml), None
+        except AccountLookupError as e:
+            logging.error(e)
+            return None, e
+
+    def _fetch_accounts(self, fingerprints):
+        try:
+            return [self._fetch_account(fp) for fp in fingerprints]
+        finally:
+            self._close_connection()
+
+    def _get_retry_time(self, failure):
+        last_attempt, attempts, kind, reason = failure
+        delay = self._retry_delays.get(kind, self._retry_delays[TRANSIENT])
+        if delay < 0:
+            return None
+        return last_attempt + delay * 2 ** min(attempts - 1, _max_backoff)
+
+    def _is_due(self, failure, now):
+        retry_time = self._get_retry_time(failure)
+        return retry_time is not None and retry_time <= now
+
+    def resolve(self, accounts_db, fingerprints, failures=None):
+        """Queries the accounts of all the `fingerprints` not already in
+        `accounts_db`, and stores them in it (None if the account couldn't
+        be obtained).
+
+        `failures` maps the fingerprints of the previously failed lookups to
+        a (last_attempt, attempts, kind, reason) tuple; they are only
+        queried again once their retry delay has expired. It is updated
+        with the outcome of the new lookups.
+        """
+
+        if failures is None:
+            failures = {}
+        now = int(time.time())
+
+        fingerprints = [fp for fp in dict.fromkeys(fingerprints) if fp not in accounts_db]
+        nb_delayed = 0
+        for fp in fingerprints:
+            failure = failures.get(fp)
+            if failure is not None and not self._is_due(failure, now):
+                accounts_db[fp] = None
+                nb_delayed += 1
+        if nb_delayed:
+            logging.info(f'Skipping {nb_delayed} accounts that failed recently')
+        fingerprints = [fp for fp in fingerprints if fp not in accounts_db]
+        if not fingerprints:
+            return
+
+        logging.info(f'Querying {len(fingerprints)} accounts...')
+        jobs = max(1, min(self._jobs, len(fingerprints)))
+        # Every thread gets its share of the fingerprints so that it can use
+        # the same connection for all its requests
+        shares = [fingerprints[i::jobs] for i in range(jobs)]
+        with ThreadPoolExecutor(jobs) as executor:
+            for share, fetched in zip(shares, executor.map(self._fetch_accounts, shares)):
+                for fp, (account, error) in zip(share, fetched):
+                    accounts_db[fp] = account
+                    if error is None:
+                        failures.pop(fp, None)
+                        continue
+                    attempts = failures[fp][1] + 1 if fp in failures else 1
+                    failures[fp] = (now, attempts, error.kind, str(error))
+
+
+def add_resolver_arguments(parser):
+    parser.add_argument('--account-jobs', type=int, default=4, help='number of concurrent account queries')
+    parser.add_argument('--account-rate', type=float, default=5, help='maximum account queries per second (0 for no limit)')
+    parser.add_argument('--account-timeout', type=float, default=10, help='timeout of the account queries in seconds')
+    parser.add_argument('--account-retry-delay', type=int, default=600,
+                        help='delay in seconds before retrying a failed account query, doubled on every failure')
+    parser.add_argument('--account-invalid-retry-delay', type=int, default=7 * 24 * 3600,
+                        help='same as --account-retry-delay for the accounts rejected by the service (negative for never)')
+
+
+def get_resolver(args):
+    return AccountResolver(
+        jobs=args.account_jobs,
+        rate=args.account_rate,
+        timeout=args.account_timeout,
+        retry_delay=args.account_retry_delay,
+        invalid_retry_delay=args.account_invalid_retry_delay,
+    )
@@ -0,0 +1,206 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+import inspect
+import itertools
+import logging
+import random
+import sqlite3
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timedelta
+from math import exp, log
+
+from .ladder import SameIdLookup
+from .ranking import ranking_systems
+
+
+# The winner is always player0
+_Game = namedtuple('_Game', 'player0 player1 end_time')
+
+# Probabilities are clamped to compute the log-loss
+_eps = 1e-15
+
+
+def load_games(database):
+    """Returns the games of the outcomes recorded in a ladder database."""
+    conn = sqlite3.connect(database)
+    rows = conn.execute('SELECT profile_id0, profile_id1, end_time FROM outcomes ORDER BY end_time').fetchall()
+    conn.close()
+    return [_Game(p0, p1, datetime.fromisoformat(end_time)) for p0, p1, end_time in rows]
+
+
+def generate_games(nb_games, nb_players=500, games_per_day=50, drift=0.02, seed=0):
+    """Returns a random series of games between players of hidden skills.
+
+    The skills are normally distributed and slowly drift with every game.
+    The probability of winning a game is the logistic function of the skill
+    difference.
+    """
+    rng = random.Random(seed)
+    skills = [rng.gauss(0, 1) for _ in range(nb_players)]
+    start = datetime(2021, 1, 1)
+    interval = timedelta(days=1) / games_per_day
+    games = []
+    for i in range(nb_games):
+        p0, p1 = rng.sample(range(nb_players), 2)
+        if rng.random() >= 1 / (1 + exp(skills[p1] - skills[p0])):
+            p0, p1 = p1, p0
+        skills[p0] += rng.gauss(0, drift)
+        skills[p1] += rng.gauss(0, drift)
+        games.append(_Game(p0, p1, start + interval * i))
+    return games
+
+
+def get_predictions(ranking, games, ratings):
+    """Returns the probability of the actual outcome of every game,
+    predicted with the ratings of the players before the game, along with
+    the number of games previously played by the least active player."""
+    last = {}
+    nb_games = {}
+    predictions = []
+    for game, (r0, r1) in zip(games, ratings):
+        p0, p1 = game.player0, game.player1
+        prv0 = last.get(p0) or ranking.get_default_rating()
+        prv1 = last.get(p1) or ranking.get_default_rating()
+        experience = min(nb_games.get(p0, 0), nb_games.get(p1, 0))
+        predictions.append((ranking.win_probability(prv0, prv1), experience))
+        last[p0], last[p1] = r0, r1
+        nb_games[p0] = nb_games.get(p0, 0) + 1
+        nb_games[p1] = nb_games.get(p1, 0) + 1
+    return predictions
+
+
+def get_metrics(predictions, min_games=0):
+    """Returns the log-loss, the Brier score and the accuracy of the
+    predictions, ignoring the games where a player had played less than
+    `min_games` games before."""
+    probs = [p for p, experience in predictions if experience >= min_games]
+    if not probs:
+        return dict(games=0, log_loss=None, brier=None, accuracy=None)
+    n = len(probs)
+    return dict(
+        games=n,
+        log_loss=-sum(log(min(max(p, _eps), 1 - _eps)) for p in probs) / n,
+        brier=sum((1 - p) ** 2 for p in probs) / n,
+        # An even prediction is half right
+        accuracy=sum(1 if p > 0.5 else 0.5 if p == 0.5 else 0 for p in probs) / n,
+    )
+
+
+def backtest(ranking, games, min_games=0):
+    """Rates the games with the ranking system, and returns its throughput,
+    peak memory and prediction metrics."""
+
+    t = time.perf_counter()
+    ratings = ranking.compute_ratings_from_series_of_games(games, SameIdLookup())
+    elapsed = time.perf_counter() - t
+
+    # Separate run since tracing the allocations slows down the computation
+    tracemalloc.start()
+    ranking.compute_ratings_from_series_of_games(games, SameIdLookup())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    metrics = dict(games_per_sec=len(games) / max(elapsed, 1e-9), peak_memory=peak)
+    metrics.update(get_metrics(get_predictions(ranking, games, ratings), min_games))
+    return metrics
+
+
+def _parse_param_value(value, default):
+    if isinstance(default, timedelta):
+        return timedelta(days=float(value))
+    return float(value)
+
+
+def parse_sweep(spec):
+    """Parses a `NAME=V1[,V2...]` sweep; time periods are in days."""
+    name, sep, values = spec.partition('=')
+    if not sep or not name or not values:
+        raise argparse.ArgumentTypeError(f'invalid sweep {spec!r}')
+    return name, values.split(',')
+
+
+def get_configurations(name, sweeps):
+    """Yields every (parameters, ranking) combination of the sweeps that
+    apply to the ranking system `name`, i.e. the ones matching a parameter
+    of its constructor."""
+    cls = ranking_systems[name]
+    defaults = {
+        p.name: p.default
+        for p in inspect.signature(cls.__init__).parameters.values()
+        if p.default is not inspect.Parameter.empty
+    }
+    params = [(param, values) for param, values in sweeps if param in defaults]
+    for combination in itertools.product(*(values for _, values in params)):
+        kwargs = {param: _parse_param_value(v, defaults[param]) for (param, _), v in zip(params, combination)}
+        yield kwargs, cls(**kwargs)
+
+
+def _fmt_params(kwargs):
+    if not kwargs:
+        return '-'
+    return ','.join(
+        f'{k}={v.total_seconds() / 86400:g}d' if isinstance(v, timedelta) else f'{k}={v:g}'
+        for k, v in kwargs.items()
+    )
+
+
+def _main(args):
+    if args.database:
+        games = load_games(args.database)
+    else:
+        games = generate_games(args.synthetic, args.players, seed=args.seed)
+    if not games:
+        logging.error('No game to replay')
+        return
+    logging.info(f'{len(games)} games')
+
+    print(f'{"ranking":>12} {"params":>28} {"games/s":>10} {"peak MiB":>9} '
+          f'{"games":>7} {"log-loss":>9} {"brier":>7} {"accuracy":>8}')
+    for name in args.ranking or list(ranking_systems):
+        for kwargs, ranking in get_configurations(name, args.sweep or []):
+            m = backtest(ranking, games, args.min_games)
+            if m['games']:
+                scores = f'{m["log_loss"]:9.4f} {m["brier"]:7.4f} {m["accuracy"]:8.2%}'
+            else:
+                scores = f'{"-":>9} {"-":>7} {"-":>8}'
+            print(f'{name:>12} {_fmt_params(kwargs):>28} {m["games_per_sec"]:10.0f} '
+                  f'{m["peak_memory"] / 2**20:9.1f} {m["games"]:7d} {scores}')
+
+
+def run():
+    logging.basicConfig(level='INFO')
+    parser = argparse.ArgumentParser(
+        description='Replays a series of games through the ranking systems to measure their speed and how well '
+                    'they predict the outcome of the next game')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('-d', '--database', help='ladder database of the outcomes to replay')
+    source.add_argument('--synthetic', type=int, metavar='NB_GAMES', help='replay a random series of games')
+    parser.add_argument('--players', type=int, default=500, help='number of players of the random games')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random games')
+    parser.add_argument('-r', '--ranking', choices=ranking_systems.keys(), action='append',
+                        help='ranking system to evaluate, can be repeated (default: all of them)')
+    parser.add_argument('-s', '--sweep', type=parse_sweep, action='append',
+                        help='NAME=V1[,V2...] values of a parameter of the ranking systems (such as k, tau or '
+                             'rating_period in days), can be repeated to sweep over all the combinations')
+    parser.add_argument('-m', '--min-games', type=int, default=0,
+                        help='only score the predictions of games between players with that many previous games')
+    args = parser.parse_args()
+    _main(args)
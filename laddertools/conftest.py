@@ -0,0 +1,61 @@
+import struct
+from datetime import timedelta
+
+import pytest
+
+
+def _replay_yaml(start_time, end_time, players, map_title='Test Map'):
+    fmt = '%Y-%m-%d %H-%M-%S'
+    lines = [
+        'Root:',
+        '\tMod: ra',
+        '\tVersion: release-20210321',
+        '\tMapUid: 0123456789abcdef',
+        f'\tMapTitle: {map_title}',
+        '\tFinalGameTick: 10000',
+        f'\tStartTimeUtc: {start_time.strftime(fmt)}',
+        f'\tEndTimeUtc: {end_time.strftime(fmt)}',
+    ]
+    for i, (name, fingerprint, outcome) in enumerate(players):
+        lines += [
+            f'Player@{i}:',
+            '\tClientIndex: 1',
+            f'\tName: {name}',
+            '\tIsHuman: True',
+            '\tIsBot: False',
+            '\tFactionName: Soviet',
+            '\tFactionId: soviet',
+            '\tColor: D7B15B',
+            '\tDisplayFactionName: Soviet',
+            '\tDisplayFactionId: soviet',
+            '\tTeam: 0',
+            '\tSpawnPoint: 1',
+            '\tIsRandomFaction: False',
+            '\tIsRandomSpawnPoint: False',
+            f'\tFingerprint: {fingerprint}',
+            f'\tOutcome: {outcome}',
+            f'\tOutcomeTimestampUtc: {end_time.strftime(fmt)}',
+            '\tDisconnectFrame: 9000',
+        ]
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def _write_replay(filename, start_time, winner, loser, duration=timedelta(minutes=15), extra_players=(), **kw):
+    """Writes a minimal replay file with only the trailing metadata block.
+
+    `winner`, `loser` and the `extra_players` are (name, fingerprint) pairs.
+    """
+    players = [(*winner, 'Won'), (*loser, 'Lost'), *((*p, 'Lost') for p in extra_players)]
+    data = _replay_yaml(start_time, start_time + duration, players, **kw)
+    length = len(data) + 4
+    with open(filename, 'wb') as f:
+        f.write(b'\0' * 64)  # fake orders
+        f.write(struct.pack('<iii', -1, 1, length - 4))
+        f.write(data)
+        f.write(struct.pack('<ii', length, -2))
+    return filename
+
+
+@pytest.fixture
+def write_replay():
+    return _write_replay
@@ -18,16 +18,22 @@
 
 import os
 import os.path as op
+import json
 import hashlib
 import logging
 import argparse
 import sqlite3
 from filelock import FileLock, Timeout
 from collections import UserDict
+from contextlib import ExitStack
+from datetime import datetime
 
-from .replay import GamePlayerInfo
+from .replay import GamePlayerInfo, GameResult, positive_int
 from .ranking import ranking_systems
-from .utils import get_results, get_profile_ids
+from .stats import stats_tables, update_global_stats, update_player_stats
+from .accounts import add_resolver_arguments, get_resolver
+from .replaycache import ReplayCache, get_default_cache_path
+from .utils import get_profile_ids, get_period_start, get_period_mtime_ns, get_replay_files, parse_results, resolve_accounts, select_results
 
 
 class PlayerLookup(UserDict):
@@ -41,16 +47,16 @@ class PlayerLookup(UserDict):
            is also case-sensitive.
     """
 
-    def __init__(self, accounts_db, ranking):
+    def __init__(self, accounts_db, rankings):
         super().__init__()
         self.accounts_db = accounts_db
-        self.ranking = ranking
+        self.rankings = rankings
         self._names = {}
 
     def _insert_from_fingerprint(self, fingerprint):
         profile_id, name, avatar_url = self.accounts_db.get(fingerprint)
         self.data.setdefault(
-            profile_id, _Player(self.ranking, profile_id, name, avatar_url)
+            profile_id, _Player(self.rankings, profile_id, name, avatar_url)
         )
         self._names.setdefault(self.data[profile_id].name, self.data[profile_id])
         return self.data[profile_id]
@@ -73,20 +79,42 @@ class PlayerLookup(UserDict):
         return f"<PlayerLookup dictionary with {len(self.data)} items>"
 
 
+class SameIdLookup:
+    """Player lookup for games that already identify the players as in the
+    rating states."""
+
+    def __getitem__(self, obj):
+        return obj
+
+
 class _Player:
-    def __init__(self, ranking, profile_id, name, avatar_url, banned=False):
+
+    __slots__ = (
+        'profile_id', 'name', 'wins', 'losses', 'prv_rating', 'rating', 'prv_rank', 'rank', 'extra_ratings',
+        'avatar_url', 'banned',
+    )
+
+    def __init__(self, rankings, profile_id, name, avatar_url, banned=False):
+        ranking, *extra_rankings = rankings
         self.profile_id = profile_id
         self.name = name
         self.wins = 0
         self.losses = 0
         self.prv_rating = ranking.get_default_rating()
         self.rating = ranking.get_default_rating()
+        self.prv_rank = None
+        self.rank = None
+        # [previous, current] display values of the ratings of the extra
+        # ranking systems
+        self.extra_ratings = [[r.get_default_rating().display_value] * 2 for r in extra_rankings]
         self.avatar_url = avatar_url
         self.banned = banned
 
-    def update_rating(self, new_rating):
+    def update_rating(self, new_rating, new_extra_ratings=()):
         self.prv_rating = self.rating
         self.rating = new_rating
+        for extra_rating, new_extra_rating in zip(self.extra_ratings, new_extra_ratings):
+            extra_rating[:] = extra_rating[1], new_extra_rating.display_value
 
     def __repr__(self):
         return f"<Player {self.name}, id={self.profile_id}>"
@@ -102,113 +130,453 @@ class _Player:
             self.losses,
             self.prv_rating.display_value,
             self.rating.display_value,
+            self.prv_rank,
+            self.rank,
+            *(value for extra_rating in self.extra_ratings for value in extra_rating),
         )
 
 
 class _OutCome:
+    """Outcome of a game, as recorded in the database.
+
+    There can be hundreds of thousands of them, so only the row is kept
+    (with the display values of the ratings at the time of the game) instead
+    of the rating objects.
+    """
+
+    __slots__ = ('end_time', 'sql_row')
 
     def __init__(self, result, p0, p1):
-        self._hash = hashlib.sha256(result.filename.encode()).hexdigest()
-        self._filename = result.filename
-        self._start_time = result.start_time
-        self._end_time = result.end_time
-        self._p0_profile_id = p0.profile_id
-        self._p1_profile_id = p1.profile_id
-        self._p0_rating0 = p0.prv_rating
-        self._p1_rating0 = p1.prv_rating
-        self._p0_rating1 = p0.rating
-        self._p1_rating1 = p1.rating
-        self._p0_faction = result.player0.faction
-        self._p1_faction = result.player1.faction
-        self._p0_selected_faction = result.player0.selected_faction
-        self._p1_selected_faction = result.player1.selected_faction
-        self._map_uid = result.map_uid
-        self._map_title = result.map_title
+        self.end_time = result.end_time
+        self.sql_row = (
+            self.get_hash(result),
+            self._sql_date_fmt(result.start_time),
+            self._sql_date_fmt(result.end_time),
+            result.filename,
+            p0.profile_id,
+            p1.profile_id,
+            p0.prv_rating.display_value,
+            p1.prv_rating.display_value,
+            p0.rating.display_value,
+            p1.rating.display_value,
+            result.player0.faction,
+            result.player1.faction,
+            result.player0.selected_faction,
+            result.player1.selected_faction,
+            result.map_uid,
+            result.map_title,
+            *(
+                value
+                for (p0_rating0, p0_rating1), (p1_rating0, p1_rating1) in zip(p0.extra_ratings, p1.extra_ratings)
+                for value in (p0_rating0, p1_rating0, p0_rating1, p1_rating1)
+            ),
+        )
+
+    @staticmethod
+    def get_hash(result):
+        return hashlib.sha256(result.filename.encode()).hexdigest()
 
     @staticmethod
     def _sql_date_fmt(dt):
         return dt.strftime('%Y-%m-%d %H:%M:%S')
 
-    @property
-    def sql_row(self):
-        return (
-            self._hash,
-            self._sql_date_fmt(self._start_time),
-            self._sql_date_fmt(self._end_time),
-            self._filename,
-            self._p0_profile_id,
-            self._p1_profile_id,
-            self._p0_rating0.display_value,
-            self._p1_rating0.display_value,
-            self._p0_rating1.display_value,
-            self._p1_rating1.display_value,
-            self._p0_faction,
-            self._p1_faction,
-            self._p0_selected_faction,
-            self._p1_selected_faction,
-            self._map_uid,
-            self._map_title,
-        )
 
+def _parse_sql_date(date_string):
+    return datetime.strptime(date_string, '%Y-%m-%d %H:%M:%S')
 
-def _get_players_outcomes(accounts_db, results, ranking_system):
 
-    ranking = ranking_systems[ranking_system]()
+class _Game:
+    """Game between two players identified by their profile id."""
 
-    player_lookup = PlayerLookup(accounts_db, ranking)
-    outcomes = []
+    __slots__ = ('player0', 'player1', 'end_time')
+
+    def __init__(self, player0, player1, end_time):
+        self.player0 = player0
+        self.player1 = player1
+        self.end_time = end_time
+
+
+def _get_players_outcomes(accounts_db, results, rankings, players=None, states=None):
 
-    ratings = ranking.compute_ratings_from_series_of_games(results, player_lookup)
+    player_lookup = PlayerLookup(accounts_db, rankings)
+    outcomes = []
 
-    for result, (r0, r1) in zip(results, ratings):
-        p0 = player_lookup[result.player0]
-        p1 = player_lookup[result.player1]
-        p0.update_rating(r0)
-        p1.update_rating(r1)
+    if states is None:
+        states = [ranking.create_state() for ranking in rankings]
+    if players is not None:
+        # Resume the ranking from the current state of the players
+        for player in players:
+            player_lookup[player.profile_id] = player
+
+    # The players are only looked up once, and the resulting games are shared
+    # by all the ranking systems
+    games = [
+        _Game(player_lookup[r.player0].profile_id, player_lookup[r.player1].profile_id, r.end_time)
+        for r in results
+    ]
+    ratings = [
+        ranking.compute_ratings_from_series_of_games(games, SameIdLookup(), state)
+        for ranking, state in zip(rankings, states)
+    ]
+
+    for result, game, (r0, r1), *extra_ratings in zip(results, games, *ratings):
+        p0 = player_lookup[game.player0]
+        p1 = player_lookup[game.player1]
+        p0.update_rating(r0, [r[0] for r in extra_ratings])
+        p1.update_rating(r1, [r[1] for r in extra_ratings])
         p0.wins += 1
         p1.losses += 1
         outcomes.append(_OutCome(result, p0, p1))
     players = player_lookup.values()
-    return players, outcomes
-
+    return players, outcomes, states
+
+
+def _set_ranks(players):
+    """Dense ranks of the players not banned, according to their displayed
+    ratings: the players of the same rating share the same rank, and the
+    following rating has the next rank. The previous ranks are the ones of
+    the previous ratings."""
+    ranked = [p for p in players if not p.banned]
+    for player in players:
+        player.prv_rank = player.rank = None
+    for rating_attr, rank_attr in (('prv_rating', 'prv_rank'), ('rating', 'rank')):
+        ratings = sorted({getattr(p, rating_attr).display_value for p in ranked}, reverse=True)
+        ranks = {rating: rank for rank, rating in enumerate(ratings, 1)}
+        for player in ranked:
+            setattr(player, rank_attr, ranks[getattr(player, rating_attr).display_value])
+
+
+_ladder_tables = ('players', 'outcomes', 'replays', 'rating_checkpoint', 'ladder_info', *stats_tables)
+
+
+def _reset_ladder(c, schema):
+    for table in _ladder_tables:
+        c.execute(f'DROP TABLE IF EXISTS {table}')
+    c.executescript(schema)
+
+
+def _get_file_id(filename):
+    st = os.stat(filename)
+    return st.st_size, st.st_mtime_ns
+
+
+def _get_replays(filenames):
+    """Returns the size and modification time of every replay, skipping the
+    ones which can not be accessed."""
+    replays = {}
+    for filename in filenames:
+        try:
+            replays[op.abspath(filename)] = _get_file_id(filename)
+        except OSError as e:
+            logging.error(f'{op.basename(filename)}: {e}')
+    return replays
+
+
+def _get_recorded_players(c, rankings, states):
+    players = []
+    cur = c.execute('SELECT profile_id, profile_name, avatar_url, wins, losses FROM players')
+    for profile_id, name, avatar_url, wins, losses in cur.fetchall():
+        player = _Player(rankings, profile_id, name, avatar_url)
+        player.wins = wins
+        player.losses = losses
+        player.prv_rating, player.rating = states[0].get_ratings(profile_id)
+        player.extra_ratings = [
+            [rating.display_value for rating in state.get_ratings(profile_id)]
+            for state in states[1:]
+        ]
+        players.append(player)
+    return players
+
+
+def _get_recorded_results(c, accounts_db):
+    # Any fingerprint of a profile is enough to identify the player again
+    fingerprints = {acc[0]: fp for fp, acc in accounts_db.items() if acc is not None}
+    cur = c.execute('''
+        SELECT
+            start_time, end_time, filename,
+            profile_id0, profile_id1,
+            p0.profile_name, p1.profile_name,
+            faction_0, faction_1,
+            selected_faction_0, selected_faction_1,
+            map_uid, map_title
+        FROM outcomes o
+        JOIN players p0 ON p0.profile_id = o.profile_id0
+        JOIN players p1 ON p1.profile_id = o.profile_id1
+        ORDER BY end_time'''
+    )
+    results = []
+    for (start_time, end_time, filename, pid0, pid1, name0, name1,
+         faction0, faction1, selected_faction0, selected_faction1, map_uid, map_title) in cur.fetchall():
+        player0 = GamePlayerInfo(fingerprints[pid0], name0, faction0, selected_faction0)
+        player1 = GamePlayerInfo(fingerprints[pid1], name1, faction1, selected_faction1)
+        results.append(GameResult(
+            _parse_sql_date(start_time), _parse_sql_date(end_time), filename,
+            player0, player1, map_uid, map_title,
+        ))
+    return results
+
+
+def _get_manifest(c, ladder_info, replays):
+    """Returns the manifest of the replays already recorded in the database,
+    or None if the database can not be updated incrementally."""
+
+    recorded_info = dict(c.execute('SELECT key, value FROM ladder_info').fetchall())
+    if recorded_info != ladder_info:
+        logging.info('Ladder settings changed (%s -> %s)', recorded_info, ladder_info)
+        return None
+
+    players_columns = {row[1] for row in c.execute('PRAGMA table_info(players)')}
+    if not {'prv_rank', 'rank'} <= players_columns:
+        logging.info('Ladder created by an older version, without the player ranks')
+        return None
+
+    manifest = {}
+    for filename, size, mtime_ns in c.execute('SELECT filename, size, mtime_ns FROM replays'):
+        if replays.get(filename) != (size, mtime_ns):
+            logging.info('%s: removed or modified since last update', op.basename(filename))
+            return None
+        manifest[filename] = (size, mtime_ns)
+    return manifest
+
+
+def _get_recorded_state(c, accounts_db, rankings, ranking_names):
+    """Returns the recorded players and the rating states after the last
+    recorded outcome."""
+
+    checkpoints = dict(c.execute('SELECT ranking, state FROM rating_checkpoint').fetchall())
+    if any(name not in checkpoints for name in ranking_names):
+        # No checkpoint in the database (created by an older version), so
+        # the states need to be computed again from the recorded outcomes
+        recorded_results = _get_recorded_results(c, accounts_db)
+        players, _, states = _get_players_outcomes(accounts_db, recorded_results, rankings)
+        return list(players), states
+
+    states = [ranking.load_state(json.loads(checkpoints[name])) for ranking, name in zip(rankings, ranking_names)]
+    return _get_recorded_players(c, rankings, states), states
+
+
+def _update_players_outcomes(c, accounts_db, results, rankings, ranking_names):
+    """Extends the recorded ladder with new results.
+
+    Returns the players, the outcomes to (re)write, the new rating states,
+    and the time from which the recorded outcomes are replaced.
+    """
 
-def _main(args):
-    conn = sqlite3.connect(args.database)
+    from_time = results[0].end_time
+    players, states = _get_recorded_state(c, accounts_db, rankings, ranking_names)
+
+    # All the states are at the same point
+    end_time = states[0].end_time
+    if end_time is None or from_time > end_time:
+        players, outcomes, states = _get_players_outcomes(accounts_db, results, rankings, players, states)
+        return players, outcomes, states, from_time
+
+    # Some of the new games happened before the last recorded game, so the
+    # ratings need to be computed again from the recorded outcomes. Only the
+    # outcomes from the earliest new game are changed though.
+    logging.info('New outcomes are not in chronological order, recomputing ratings from %s', from_time)
+    recorded_results = _get_recorded_results(c, accounts_db)
+    all_results = sorted(recorded_results + results, key=lambda r: r.end_time)
+    players, outcomes, states = _get_players_outcomes(accounts_db, all_results, rankings)
+    outcomes = [o for o in outcomes if o.end_time >= from_time]
+    return players, outcomes, states, from_time
+
+
+def _add_ranking_columns(c, ranking_names):
+    """The first ranking system uses the main rating columns, the other ones
+    get their own columns."""
+    columns = dict(
+        players=('prv_rating_{}', 'rating_{}'),
+        outcomes=('rating_0_prv_{}', 'rating_1_prv_{}', 'rating_0_{}', 'rating_1_{}'),
+    )
+    for table, names in columns.items():
+        existing = {row[1] for row in c.execute(f'PRAGMA table_info({table})')}
+        for ranking_name in ranking_names[1:]:
+            for name in names:
+                column = name.format(ranking_name)
+                if column not in existing:
+                    c.execute(f'ALTER TABLE {table} ADD COLUMN {column} INTEGER')
+
+
+def _sql_values(row):
+    return '(' + ','.join('?' * len(row)) + ')'
+
+
+class _Ladder:
+    """Database of a ladder target, with its own period, ranking system and
+    bans file."""
+
+    def __init__(self, target, schema, replays, incremental):
+        self.target = target
+        self.conn = sqlite3.connect(target.database)
+        self.replays = replays
+
+        c = self.conn.cursor()
+
+        period_start = get_period_start(target.period)
+        self.ladder_info = dict(
+            ranking='+'.join(target.ranking),
+            period_start=str(period_start) if period_start else 'all',
+        )
 
-    c = conn.cursor()
+        manifest = None
+        if incremental:
+            c.executescript(schema)
+            manifest = _get_manifest(c, self.ladder_info, replays)
+
+        if manifest is None:
+            # We don't know if the new submitted replays will be properly ordered,
+            # so all the information needs to be reconstructed
+            _reset_ladder(c, schema)
+            manifest = {}
+        self.manifest = manifest
+        _add_ranking_columns(c, target.ranking)
+
+        # Re-use the cached OpenRA account information to prevent stressing too
+        # much the service
+        request_accounts = c.execute('SELECT * FROM accounts')
+        self.accounts_db = {fp: (pid, pname, avatar_url) for fp, pid, pname, avatar_url in request_accounts.fetchall()}
+        request_failures = c.execute('SELECT * FROM account_failures')
+        self.account_failures = {fp: failure for fp, *failure in request_failures.fetchall()}
+
+        # The replays too old to be part of the period are not even parsed
+        min_mtime_ns = get_period_mtime_ns(target.period)
+        self.new_replays = [
+            fn for fn, (size, mtime_ns) in replays.items()
+            if fn not in manifest and (min_mtime_ns is None or mtime_ns >= min_mtime_ns)
+        ]
+
+    def update(self, accounts_db, account_failures, parsed):
+        c = self.conn.cursor()
+
+        new_replays = set(self.new_replays)
+        results = select_results(accounts_db, [r for r in parsed if r.filename in new_replays], self.target.period)
+
+        names = self.target.ranking
+        rankings = [ranking_systems[name]() for name in names]
+        if not self.manifest:
+            players, outcomes, states = _get_players_outcomes(accounts_db, results, rankings)
+            from_time = None
+        elif results:
+            players, outcomes, states, from_time = _update_players_outcomes(c, accounts_db, results, rankings, names)
+        else:
+            (players, states), outcomes, from_time = _get_recorded_state(c, accounts_db, rankings, names), [], None
+
+        if self.target.bans_file:
+            banned_profiles = get_profile_ids(self.target.bans_file)
+            for player in players:
+                player.banned = player.profile_id in banned_profiles
+        _set_ranks(players)
+
+        outcomes_sql = [o.sql_row for o in outcomes]
+        players_sql = [p.sql_row for p in players]
+        accounts_sql = [(fp, acc[0], acc[1], acc[2]) for fp, acc in accounts_db.items() if acc is not None]
+        account_failures_sql = [(fp, *failure) for fp, failure in account_failures.items()]
+        checkpoints_sql = [
+            (name, _OutCome._sql_date_fmt(state.end_time) if state.end_time else None, json.dumps(state.to_json()))
+            for name, state in zip(names, states)
+        ]
+        replays_sql = [(r.filename, *self.replays[r.filename], _OutCome.get_hash(r)) for r in results]
+        ladder_info_sql = list(self.ladder_info.items())
+
+        if from_time is not None:
+            c.execute('DELETE FROM outcomes WHERE end_time >= ?', (_OutCome._sql_date_fmt(from_time),))
+        c.execute('DELETE FROM players')
+        c.execute('DELETE FROM rating_checkpoint')
+
+        c.executemany('INSERT OR IGNORE INTO accounts VALUES (?,?,?,?)', accounts_sql)
+        c.execute('DELETE FROM account_failures')
+        c.executemany('INSERT INTO account_failures VALUES (?,?,?,?,?)', account_failures_sql)
+        if players_sql:
+            c.executemany(f'INSERT OR IGNORE INTO players VALUES {_sql_values(players_sql[0])}', players_sql)
+        if outcomes_sql:
+            c.executemany(f'INSERT OR IGNORE INTO outcomes VALUES {_sql_values(outcomes_sql[0])}', outcomes_sql)
+        c.executemany('INSERT INTO rating_checkpoint VALUES (?,?,?)', checkpoints_sql)
+        c.executemany('INSERT OR REPLACE INTO replays VALUES (?,?,?,?)', replays_sql)
+        c.executemany('INSERT OR REPLACE INTO ladder_info VALUES (?,?)', ladder_info_sql)
+        new_outcomes = not self.manifest or bool(results)
+        update_global_stats(c, new_outcomes)
+        if new_outcomes:
+            update_player_stats(c, _OutCome._sql_date_fmt(from_time) if from_time is not None else None)
+
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+_target_options = ('period', 'ranking', 'bans-file')
+
+
+def _parse_rankings(value, spec):
+    rankings = value.split('+') if value else []
+    if not rankings or any(name not in ranking_systems for name in rankings):
+        raise argparse.ArgumentTypeError(f'unknown ranking system in target {spec!r}')
+    if len(set(rankings)) != len(rankings):
+        raise argparse.ArgumentTypeError(f'duplicated ranking system in target {spec!r}')
+    return rankings
+
+
+def _parse_target(spec):
+    """Parses a `DATABASE[,period=P][,ranking=R[+R...]][,bans-file=F]` target."""
+    database, *options = spec.split(',')
+    if not database:
+        raise argparse.ArgumentTypeError(f'missing database in target {spec!r}')
+    target = dict(database=database)
+    for option in options:
+        key, sep, value = option.partition('=')
+        if not sep or key not in _target_options:
+            raise argparse.ArgumentTypeError(f'invalid option {option!r} in target {spec!r}')
+        target[key.replace('-', '_')] = value or None
+    if 'ranking' in target:
+        target['ranking'] = _parse_rankings(target['ranking'], spec)
+    if target.get('period') not in (None, '1m', '2m'):
+        raise argparse.ArgumentTypeError(f'unknown period in target {spec!r}')
+    return target
+
+
+def _get_targets(args):
+    """The targets inherit the period, ranking system and bans file from the
+    main options unless they override them."""
+    rankings = list(dict.fromkeys(args.ranking or ['trueskill']))
+    default = dict(database=args.database, period=args.period, ranking=rankings, bans_file=args.bans_file)
+    targets = getattr(args, 'targets', None) or [{}]
+    return [argparse.Namespace(**{**default, **target}) for target in targets]
+
+
+def _merge_account_failures(ladders):
+    # The most recent attempt of every fingerprint is the relevant one
+    account_failures = {}
+    for ladder in ladders:
+        for fp, failure in ladder.account_failures.items():
+            if fp not in account_failures or failure[0] > account_failures[fp][0]:
+                account_failures[fp] = failure
+    return account_failures
 
-    # We don't know if the new submitted replays will be properly ordered, so
-    # all the information needs to be reconstructed
-    c.execute('DROP TABLE IF EXISTS players')
-    c.execute('DROP TABLE IF EXISTS outcomes')
 
+def _main(args):
     with open(args.schema) as f:
-        c.executescript(f.read())
-
-    # Re-use the cached OpenRA account information to prevent stressing too
-    # much the service
-    request_accounts = c.execute('SELECT * FROM accounts')
-    accounts_db = {fp: (pid, pname, avatar_url) for fp, pid, pname, avatar_url in request_accounts.fetchall()}
+        schema = f.read()
 
-    results = get_results(accounts_db, args.replays, args.period)
-
-    players, outcomes = _get_players_outcomes(accounts_db, results, args.ranking)
-
-    if args.bans_file:
-        banned_profiles = get_profile_ids(args.bans_file)
-        for player in players:
-            player.banned = player.profile_id in banned_profiles
+    targets = _get_targets(args)
+    replays = _get_replays(fn for fn in get_replay_files(args.replays) if fn.endswith('.orarep'))
+    ladders = [_Ladder(target, schema, replays, args.incremental) for target in targets]
 
-    outcomes_sql = [o.sql_row for o in outcomes]
-    players_sql = [p.sql_row for p in players]
-    accounts_sql = [(fp, acc[0], acc[1], acc[2]) for fp, acc in accounts_db.items() if acc is not None]
+    # The replays are parsed once for all the targets, and the accounts are
+    # shared between them as well
+    new_replays = list(dict.fromkeys(fn for ladder in ladders for fn in ladder.new_replays))
+    accounts_db = {}
+    for ladder in ladders:
+        accounts_db.update(ladder.accounts_db)
+    account_failures = _merge_account_failures(ladders)
 
-    c.executemany('INSERT OR IGNORE INTO accounts VALUES (?,?,?,?)', accounts_sql)
-    c.executemany('INSERT OR IGNORE INTO players VALUES (?,?,?,?,?,?,?,?)', players_sql)
-    c.executemany('INSERT OR IGNORE INTO outcomes VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', outcomes_sql)
+    with ReplayCache(args.cache or get_default_cache_path(targets[0].database)) as cache:
+        parsed = parse_results(new_replays, cache, args.jobs)
+    resolve_accounts(accounts_db, parsed, get_resolver(args), account_failures)
 
-    conn.commit()
-    conn.close()
+    for ladder in ladders:
+        ladder.update(accounts_db, account_failures, parsed)
+        ladder.close()
 
 
 def run():
@@ -216,16 +584,29 @@ def run():
     parser = argparse.ArgumentParser()
     parser.add_argument('-d', '--database', default='db.sqlite3')
     parser.add_argument('-s', '--schema', default=op.join(op.dirname(__file__), 'ladder.sql'))
-    parser.add_argument('-r', '--ranking', choices=ranking_systems.keys(), default='trueskill')
+    parser.add_argument('-r', '--ranking', choices=ranking_systems.keys(), action='append',
+                        help='ranking system (default: trueskill), can be repeated to compute several ones in '
+                             'the same database, the first one being the main one')
     parser.add_argument('-p', '--period')
     parser.add_argument('--bans-file')
+    parser.add_argument('-t', '--target', dest='targets', action='append', type=_parse_target,
+                        help='DATABASE[,period=P][,ranking=R[+R...]][,bans-file=F] output database, can be repeated '
+                             'to build several databases from the same replays (replaces --database)')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='only parse the new replays and update the existing database')
+    parser.add_argument('-j', '--jobs', type=positive_int, default=1, help='number of replays parsed in parallel')
+    parser.add_argument('-c', '--cache', help='replays cache file (default: next to the database)')
+    add_resolver_arguments(parser)
     parser.add_argument('replays', nargs='*')
     args = parser.parse_args()
 
-    lockfile = args.database + '.lock'
-    lock = FileLock(lockfile, timeout=1)
-    try:
-        with lock:
-            _main(args)
-    except Timeout:
-        logging.error('Another instance of this application currently holds the %s lock file.', lockfile)
+    with ExitStack() as stack:
+        for target in _get_targets(args):
+            lockfile = target.database + '.lock'
+            lock = FileLock(lockfile, timeout=1)
+            try:
+                stack.enter_context(lock)
+            except Timeout:
+                logging.error('Another instance of this application currently holds the %s lock file.', lockfile)
+                return
+        _main(args)
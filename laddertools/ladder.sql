@@ -5,6 +5,17 @@ CREATE TABLE IF NOT EXISTS accounts (
 	avatar_url   TEXT
 );
 
+-- Failed account lookups, retried with an exponential backoff
+CREATE TABLE IF NOT EXISTS account_failures (
+	fingerprint  TEXT PRIMARY KEY,
+	last_attempt INTEGER NOT NULL,
+	attempts     INTEGER NOT NULL,
+	kind         TEXT NOT NULL,
+	reason       TEXT NOT NULL
+);
+
+-- The ranks are the dense ranks of the (previous) ratings, NULL for the
+-- banned players
 CREATE TABLE IF NOT EXISTS players (
 	profile_id   INTEGER PRIMARY KEY,
 	profile_name TEXT NOT NULL,
@@ -13,9 +24,14 @@ CREATE TABLE IF NOT EXISTS players (
 	wins         INTEGER NOT NULL,
 	losses       INTEGER NOT NULL,
 	prv_rating   INTEGER NOT NULL,
-	rating       INTEGER NOT NULL
+	rating       INTEGER NOT NULL,
+	prv_rank     INTEGER,
+	rank         INTEGER
 );
 
+-- Leaderboard
+CREATE INDEX IF NOT EXISTS players_rating ON players(rating) WHERE NOT banned;
+
 CREATE TABLE IF NOT EXISTS outcomes (
 	hash                  TEXT NOT NULL PRIMARY KEY,
 	start_time            TEXT NOT NULL,
@@ -34,3 +50,75 @@ CREATE TABLE IF NOT EXISTS outcomes (
 	map_uid               TEXT NOT NULL,
 	map_title             TEXT NOT NULL
 );
+
+-- Indexes of the read paths of ladderweb; created on existing databases as
+-- well since the schema is applied on every run
+CREATE INDEX IF NOT EXISTS outcomes_end_time ON outcomes(end_time, hash);
+CREATE INDEX IF NOT EXISTS outcomes_profile_id0 ON outcomes(profile_id0, end_time);
+CREATE INDEX IF NOT EXISTS outcomes_profile_id1 ON outcomes(profile_id1, end_time);
+CREATE INDEX IF NOT EXISTS outcomes_map_title ON outcomes(map_title);
+CREATE INDEX IF NOT EXISTS outcomes_selected_faction_0 ON outcomes(selected_faction_0);
+CREATE INDEX IF NOT EXISTS outcomes_selected_faction_1 ON outcomes(selected_faction_1);
+
+-- Manifest of the replays recorded in the outcomes
+CREATE TABLE IF NOT EXISTS replays (
+	filename     TEXT PRIMARY KEY,
+	size         INTEGER NOT NULL,
+	mtime_ns     INTEGER NOT NULL,
+	hash         TEXT NOT NULL
+);
+
+-- Serialized rating state of every ranking system after the last outcome, to
+-- resume the ranking
+CREATE TABLE IF NOT EXISTS rating_checkpoint (
+	ranking      TEXT PRIMARY KEY,
+	end_time     TEXT,
+	state        TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ladder_info (
+	key          TEXT PRIMARY KEY,
+	value        TEXT NOT NULL
+);
+
+-- Aggregates of the global stats page, computed by every ora-ladder run
+CREATE TABLE IF NOT EXISTS stats_summary (
+	nb_games     INTEGER NOT NULL,
+	nb_players   INTEGER NOT NULL,
+	avg_duration TEXT
+);
+
+CREATE TABLE IF NOT EXISTS stats_factions (
+	faction      TEXT PRIMARY KEY,
+	count        INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS stats_maps (
+	map_title    TEXT PRIMARY KEY,
+	count        INTEGER NOT NULL
+);
+
+-- Number of games of every day from the first game to the day of the update,
+-- including the days without games
+CREATE TABLE IF NOT EXISTS stats_daily_activity (
+	date         TEXT PRIMARY KEY,
+	count        INTEGER NOT NULL
+);
+
+-- Aggregates of the profile page of every player, computed by every
+-- ora-ladder run
+CREATE TABLE IF NOT EXISTS player_stats (
+	profile_id        INTEGER PRIMARY KEY,
+	avg_game_duration TEXT,
+	factions          TEXT NOT NULL, -- JSON list of [faction, count]
+	maps              TEXT NOT NULL  -- JSON list of [map_title, wins, losses]
+);
+
+-- Rating evolution of every player, already rescaled to a fixed number of
+-- data points
+CREATE TABLE IF NOT EXISTS player_rating_series (
+	profile_id   INTEGER NOT NULL,
+	point        INTEGER NOT NULL,
+	rating       INTEGER NOT NULL,
+	PRIMARY KEY (profile_id, point)
+) WITHOUT ROWID;
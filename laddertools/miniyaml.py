@@ -15,34 +15,100 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import re
+import functools
 
 
-_LINE_RE = re.compile(r'^(?P<indent>\t*)(?:(?P<key>[^:]*):\s*)?(?P<value>.*)')
+def load(yaml_str):
+    """Parses a MiniYAML document into nested dicts.
 
+    Nodes without children are set to an empty string, just like the leaves
+    without value.
+    """
 
-def _cleanup(d):
-    if d == {}:
-        return ''
-    for k, v in d.items():
-        if not isinstance(v, dict):
+    yaml_str = str(yaml_str, 'utf-8')  # accepts any bytes-like object
+    root = {}
+    levels = [root]
+    nodes = []  # (parent, key, node) for every node created
+    for line in yaml_str.splitlines():
+        key, sep, value = line.partition(':')
+        if not sep:
             continue
-        d[k] = _cleanup(d[k])
-    return d
+        indented_key = key
+        key = key.lstrip('\t')
+        if not key:
+            continue
+        level = len(indented_key) - len(key)
+        parent = levels[level]
+        value = value.lstrip()
+        if not value:
+            value = {}
+            del levels[level + 1:]
+            levels.append(value)
+            nodes.append((parent, key, value))
+        parent[key] = value
 
+    # Replace the nodes which didn't get any children, unless they were
+    # overridden in the meantime
+    for parent, key, node in nodes:
+        if not node and parent.get(key) is node:
+            parent[key] = ''
 
-def load(yaml_str):
-    yaml_str = yaml_str.decode()
-    levels = [{}]
+    return root if root else ''
+
+
+@functools.lru_cache(maxsize=16)
+def _compile_paths(paths):
+    """Builds a tree of the requested keys, where every key maps to its path
+    (None if only its children are requested) and the tree of its children
+    (None if it has no requested children). The number of distinct paths is
+    returned as well."""
+    tree = {}
+    for path in paths:
+        *parents, key = path.split('.')
+        node = tree
+        for i, parent in enumerate(parents):
+            parent_path, children = node.get(parent, (None, None))
+            if children is None:
+                children = {}
+                node[parent] = (parent_path, children)
+            node = children
+        _, children = node.get(key, (None, None))
+        node[key] = (path, children)
+    return tree, len(set(paths))
+
+
+def extract(yaml_str, paths):
+    """Extracts only the values at `paths` from a MiniYAML document.
+
+    A path is made of the keys joined with dots, such as `Root.MapUid`. The
+    returned dict maps every path found to its value; a path to a node maps
+    to its (empty) value, so it can be used to check for its presence. The
+    nodes without any requested path are skipped without being built, and
+    the parsing stops as soon as all the paths are found.
+    """
+
+    yaml_str = str(yaml_str, 'utf-8')  # accepts any bytes-like object
+    tree, nb_paths = _compile_paths(tuple(paths))
+    ret = {}
+    levels = [tree]  # requested keys at every level, None if not of interest
     for line in yaml_str.splitlines():
-        m = re.match(_LINE_RE, line)
-        indent, key, value = m.group('indent', 'key', 'value')
-        level = len(indent)
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        indented_key = key
+        key = key.lstrip('\t')
         if not key:
             continue
+        level = len(indented_key) - len(key)
+        requested = levels[level]
+        entry = requested.get(key) if requested is not None else None
+        value = value.lstrip()
         if not value:
-            value = {}
-            levels = levels[:level + 1] + [value]
-        parent = levels[level]
-        parent[key] = value
-    return _cleanup(levels[0])
+            del levels[level + 1:]
+            levels.append(entry[1] if entry is not None else None)
+        if entry is None or entry[0] is None:
+            continue
+        ret[entry[0]] = value
+        if len(ret) == nb_paths:
+            break
+    return ret
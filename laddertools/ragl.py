@@ -24,6 +24,9 @@ import sqlite3
 import yaml
 from filelock import FileLock, Timeout
 
+from .accounts import add_resolver_arguments, get_resolver
+from .replay import positive_int
+from .replaycache import ReplayCache, get_default_cache_path
 from .utils import get_results
 
 
@@ -200,8 +203,13 @@ def _main(args):
     # much the service
     request_accounts = c.execute('SELECT * FROM accounts')
     accounts_db = {fp: (pid, pname, avatar_url) for fp, pid, pname, avatar_url in request_accounts.fetchall()}
+    request_failures = c.execute('SELECT * FROM account_failures')
+    account_failures = {fp: failure for fp, *failure in request_failures.fetchall()}
 
-    results = get_results(accounts_db, args.replays)
+    resolver = get_resolver(args)
+    with ReplayCache(args.cache or get_default_cache_path(args.database)) as cache:
+        results = get_results(accounts_db, args.replays, cache=cache, jobs=args.jobs, resolver=resolver,
+                              account_failures=account_failures)
 
     with open(args.playersinfo) as f:
         players_info = yaml.safe_load(f)
@@ -210,8 +218,11 @@ def _main(args):
     outcomes_sql = [o.sql_row for o in outcomes]
     players_sql = [p.sql_row for p in players]
     accounts_sql = [(fp, acc[0], acc[1], acc[2]) for fp, acc in accounts_db.items() if acc is not None]
+    account_failures_sql = [(fp, *failure) for fp, failure in account_failures.items()]
 
     c.executemany('INSERT OR IGNORE INTO accounts VALUES (?,?,?,?)', accounts_sql)
+    c.execute('DELETE FROM account_failures')
+    c.executemany('INSERT INTO account_failures VALUES (?,?,?,?,?)', account_failures_sql)
     c.executemany('INSERT OR IGNORE INTO players VALUES (?,?,?,?,?,?,?)', players_sql)
     c.executemany('INSERT OR IGNORE INTO outcomes VALUES (?,?,?,?,?,?,?,?,?,?,?,?)', outcomes_sql)
 
@@ -232,6 +243,9 @@ def run():
     parser.add_argument('-d', '--database', default='db-ragl.sqlite3')
     parser.add_argument('-s', '--schema', default=op.join(op.dirname(__file__), 'ragl.sql'))
     parser.add_argument('-p', '--playersinfo', default=op.join(op.dirname(__file__), 'ragl-s12.yml'))
+    parser.add_argument('-j', '--jobs', type=positive_int, default=1, help='number of replays parsed in parallel')
+    parser.add_argument('-c', '--cache', help='replays cache file (default: next to the database)')
+    add_resolver_arguments(parser)
     parser.add_argument('replays', nargs='*')
     args = parser.parse_args()
 
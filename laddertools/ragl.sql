@@ -5,6 +5,15 @@ CREATE TABLE IF NOT EXISTS accounts (
 	avatar_url   TEXT
 );
 
+-- Failed account lookups, retried with an exponential backoff
+CREATE TABLE IF NOT EXISTS account_failures (
+	fingerprint  TEXT PRIMARY KEY,
+	last_attempt INTEGER NOT NULL,
+	attempts     INTEGER NOT NULL,
+	kind         TEXT NOT NULL,
+	reason       TEXT NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS players (
 	profile_id   INTEGER PRIMARY KEY,
 	profile_name TEXT NOT NULL,
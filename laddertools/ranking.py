@@ -15,13 +15,69 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-from .rankings.trueskill import RankingTrueskill
-from .rankings.elo import RankingELO
-from .rankings.glicko import RankingGlicko
+import logging
+import re
+from collections.abc import Mapping
+from importlib.metadata import EntryPoint, entry_points
 
 
-ranking_systems = dict(
-    trueskill=RankingTrueskill,
-    elo=RankingELO,
-    glicko=RankingGlicko,
+_entry_point_group = 'oraladder.rankings'
+
+# The names end up in the column names of the ladder databases
+_name_re = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+# Also registered as entry points in setup.py, but kept here so that the
+# builtin systems are available when running from the source tree
+_builtin_systems = dict(
+    trueskill='laddertools.rankings.trueskill:RankingTrueskill',
+    trueskill1v1='laddertools.rankings.trueskill1v1:RankingTrueskill1v1',
+    elo='laddertools.rankings.elo:RankingELO',
+    glicko='laddertools.rankings.glicko:RankingGlicko',
 )
+
+
+def _get_entry_points():
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return eps.select(group=_entry_point_group)
+    return eps.get(_entry_point_group, [])
+
+
+class _RankingSystems(Mapping):
+    """Ranking systems by name, registered in the `oraladder.rankings` entry
+    point group. The module of a ranking system is only imported the first
+    time it is looked up."""
+
+    def __init__(self):
+        self._entry_points = None
+        self._loaded = {}
+
+    def _get_registered(self):
+        if self._entry_points is None:
+            self._entry_points = {
+                name: EntryPoint(name, value, _entry_point_group)
+                for name, value in _builtin_systems.items()
+            }
+            for ep in _get_entry_points():
+                if not _name_re.fullmatch(ep.name):
+                    logging.warning('Ignoring ranking system %r: invalid name', ep.name)
+                    continue
+                self._entry_points.setdefault(ep.name, ep)
+        return self._entry_points
+
+    def __getitem__(self, name):
+        if name not in self._loaded:
+            self._loaded[name] = self._get_registered()[name].load()
+        return self._loaded[name]
+
+    def __contains__(self, name):
+        return name in self._get_registered()
+
+    def __iter__(self):
+        return iter(self._get_registered())
+
+    def __len__(self):
+        return len(self._get_registered())
+
+
+ranking_systems = _RankingSystems()
@@ -16,26 +16,92 @@
 #
 
 from abc import ABC, abstractmethod
+from datetime import datetime
+
+
+class RatingState:
+    """Ratings of the players after a series of games.
+
+    The state can be extended one game at a time with `apply()`, and
+    serialized with `to_json()` so that the ranking can be resumed later on
+    from the last game applied (`end_time`). The players can be any hashable
+    JSON value (typically a profile id).
+    """
+
+    def __init__(self, ranking):
+        self.ranking = ranking
+        self.end_time = None
+        # player -> (previous rating, rating)
+        self.ratings = {}
+
+    def get_rating(self, player):
+        if player not in self.ratings:
+            return self.ranking.get_default_rating()
+        return self.ratings[player][1]
+
+    def get_ratings(self, player):
+        """Returns the rating of the player before their last game, and their
+        current rating."""
+        if player not in self.ratings:
+            return self.ranking.get_default_rating(), self.ranking.get_default_rating()
+        return self.ratings[player]
+
+    def _rate(self, winner, loser, end_time):
+        return self.ranking.record_result(self.get_rating(winner), self.get_rating(loser))
+
+    def apply(self, winner, loser, end_time):
+        """Records the outcome of a game, the games being applied in
+        chronological order. Returns the new ratings of the winner and the
+        loser."""
+        r0, r1 = self._rate(winner, loser, end_time)
+        self.ratings[winner] = (self.get_rating(winner), r0)
+        self.ratings[loser] = (self.get_rating(loser), r1)
+        self.end_time = end_time
+        return r0, r1
+
+    def to_json(self):
+        return dict(
+            end_time=self.end_time.isoformat(' ') if self.end_time else None,
+            ratings=[[player, prv.state, cur.state] for player, (prv, cur) in self.ratings.items()],
+        )
+
+    def load_json(self, data):
+        self.end_time = datetime.fromisoformat(data['end_time']) if data['end_time'] else None
+        self.ratings = {
+            player: (self.ranking.rating_from_state(prv), self.ranking.rating_from_state(cur))
+            for player, prv, cur in data['ratings']
+        }
 
 
 class RankingBase(ABC):
 
-    def compute_ratings_from_series_of_games(self, games, player_lookup):
-        player_ratings = {}
-        game_ratings = []
-        for g in games:
-            p0 = player_lookup[g.player0]
-            p1 = player_lookup[g.player1]
-            r0 = player_ratings.get(p0, self.get_default_rating())
-            r1 = player_ratings.get(p1, self.get_default_rating())
+    def create_state(self):
+        """Returns a new `RatingState` without any game."""
+        return RatingState(self)
+
+    def load_state(self, data):
+        """Returns the `RatingState` serialized in `data`."""
+        state = self.create_state()
+        state.load_json(data)
+        return state
 
-            r0_new, r1_new = self.record_result(r0, r1)
-            player_ratings[p0] = r0_new
-            player_ratings[p1] = r1_new
+    def compute_ratings_from_series_of_games(self, games, player_lookup, state=None):
+        """Returns the pair of new ratings of the players of every game.
 
-            item = (r0_new, r1_new)
-            game_ratings.append(item)
-        return game_ratings
+        If specified, the `state` is extended with the games; the players
+        are identified in the state by their `player_lookup` values.
+        """
+        if state is None:
+            state = self.create_state()
+        return [
+            state.apply(player_lookup[g.player0], player_lookup[g.player1], g.end_time)
+            for g in games
+        ]
+
+    def win_probability(self, rating0, rating1):
+        """Returns the probability that a player of rating `rating0` wins
+        against a player of rating `rating1`."""
+        raise NotImplementedError
 
     @classmethod
     @abstractmethod
@@ -45,3 +111,7 @@ class RankingBase(ABC):
     @abstractmethod
     def record_result(self, winner_rating, loser_rating):
         """Returns a pair of new ratings, one for the winner and one for the loser."""
+
+    @abstractmethod
+    def rating_from_state(self, state):
+        """Returns a rating from the list of values of its `state` property."""
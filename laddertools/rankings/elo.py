@@ -20,6 +20,8 @@ from .abc import RankingBase
 
 class _RatingELO:
 
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
@@ -27,18 +29,51 @@ class _RatingELO:
     def display_value(self):
         return round(self.value)
 
+    @property
+    def state(self):
+        return [self.value]
+
 
 class RankingELO(RankingBase):
 
-    _k = 32
+    def __init__(self, k=32):
+        self._k = k
 
     @classmethod
     def _expected_score(cls, r0, r1):
         return 1 / (1 + 10 ** ((r0.value - r1.value) / 400))
 
-    @classmethod
-    def _elo(cls, old, expected, result):
-        return old.value + cls._k * (result - expected)
+    def _elo(self, old, expected, result):
+        return old.value + self._k * (result - expected)
+
+    def compute_ratings_from_series_of_games(self, games, player_lookup, state=None):
+        """Same as `RankingBase.compute_ratings_from_series_of_games()`, with
+        `record_result()` and the state updates inlined: the per-game
+        overhead (method calls and intermediate objects) is larger than the
+        Elo computation itself. The floating point operations are the ones
+        of `record_result()`, so the ratings are identical."""
+        if state is None:
+            state = self.create_state()
+        if not games:
+            return []
+
+        k = self._k
+        ratings = state.ratings
+        default = self.get_default_rating().value
+        game_ratings = []
+        for g in games:
+            p0, p1 = player_lookup[g.player0], player_lookup[g.player1]
+            prv0 = ratings[p0][1] if p0 in ratings else _RatingELO(default)
+            prv1 = ratings[p1][1] if p1 in ratings else _RatingELO(default)
+            rw, rl = prv0.value, prv1.value
+            exp0 = 1 / (1 + 10 ** ((rl - rw) / 400))
+            exp1 = 1 / (1 + 10 ** ((rw - rl) / 400))
+            item = (_RatingELO(rw + k * (1 - exp0)), _RatingELO(rl + k * (0 - exp1)))
+            ratings[p0] = (prv0, item[0])
+            ratings[p1] = (prv1, item[1])
+            game_ratings.append(item)
+        state.end_time = games[-1].end_time
+        return game_ratings
 
     def record_result(self, winner_rating, loser_rating):
         exp0 = self._expected_score(loser_rating, winner_rating)
@@ -47,6 +82,12 @@ class RankingELO(RankingBase):
         r1 = _RatingELO(self._elo(loser_rating, exp1, 0))
         return r0, r1
 
+    def win_probability(self, rating0, rating1):
+        return self._expected_score(rating1, rating0)
+
     @classmethod
     def get_default_rating(cls):
         return _RatingELO(1000)
+
+    def rating_from_state(self, state):
+        return _RatingELO(*state)
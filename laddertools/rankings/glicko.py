@@ -16,15 +16,83 @@
 #
 
 from math import sqrt, pi, exp, log, hypot
-from itertools import count
-from datetime import timedelta
-from collections import deque, defaultdict
-
-from .abc import RankingBase
+from itertools import count, groupby
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .abc import RankingBase, RatingState
+
+
+def _inflate_phi(phi, std, nb_periods):
+    """Closed form of the increase of phi over `nb_periods` rating periods
+    without games (`phi² + n·std²`, RD being capped to 350), equivalent to
+    `nb_periods` calls to `RankingGlicko.compute_new_rating()` without
+    opponents."""
+    RD = np.minimum(_RatingGlicko.phi_to_RD(np.sqrt(phi ** 2 + nb_periods * std ** 2)), 350)
+    return RD / _RatingGlicko._k
+
+
+def _rate_period(mu, phi, std, v_sum, delta_sum, tau=0.8, eps=1e-6):
+    """Batched version of `RankingGlicko.compute_new_rating()` for all the
+    players of a rating period, on the glicko-2 scale.
+
+    Args:
+        mu, phi, std: arrays of the ratings of the players at the onset of
+            the rating period
+        v_sum, delta_sum: arrays of the sums of the `v` and `delta` terms
+            of the games of every player over the period
+
+    Returns:
+        A tuple of the arrays of the new mu, phi and std.
+    """
+
+    # step 3, 4 -- compute `v` and `delta`
+    v = 1 / v_sum
+    delta = v * delta_sum
+
+    # step 5 -- determine the new value of std, the Illinois iterations
+    # being done on all the players at once until they all converged
+    a = np.log(std ** 2)
+
+    def f(x, i):
+        n1 = np.exp(x) * (delta[i] ** 2 - phi[i] ** 2 - v[i] - np.exp(x))
+        d1 = 2 * (phi[i] ** 2 + v[i] + np.exp(x)) ** 2
+        n2 = x - a[i]
+        d2 = tau ** 2
+        return n1 / d1 - n2 / d2
+
+    k = np.maximum(1, np.floor(a / tau) + 1)
+    k[a - k * tau >= 0] += 1
+    large_delta = delta ** 2 > phi ** 2 + v
+    B = np.where(large_delta, np.log(np.where(large_delta, delta ** 2 - phi ** 2 - v, 1)), a - k * tau)
+    A = a.copy()
+
+    all_players = np.arange(len(mu))
+    f_A, f_B = f(A, all_players), f(B, all_players)
+    i = np.flatnonzero(np.abs(B - A) > eps)
+    while len(i):
+        C = A[i] + (A[i] - B[i]) * f_A[i] / (f_B[i] - f_A[i])
+        f_C = f(C, i)
+        swap = f_C * f_B[i] < 0
+        A[i] = np.where(swap, B[i], A[i])
+        f_A[i] = np.where(swap, f_B[i], f_A[i] / 2)
+        B[i], f_B[i] = C, f_C
+        i = i[np.abs(B[i] - A[i]) > eps]
+    new_std = np.exp(A / 2)
+
+    # step 6, 7, 8 -- update ratings
+    phi_star = np.sqrt(phi ** 2 + std ** 2)
+    new_phi = 1 / np.sqrt(1 / (phi_star ** 2) + 1 / v)
+    new_mu = mu + new_phi ** 2 * delta / v
+
+    return new_mu, new_phi, new_std
 
 
 class _RatingGlicko:
 
+    __slots__ = ('r', 'RD', 'std')
+
     _initial_rating = 1500
 
     # scaling factor used to go from / to glicko to glicko-2 scale.
@@ -46,6 +114,10 @@ class _RatingGlicko:
     def value(self):
         return self.r
 
+    @property
+    def state(self):
+        return [self.r, self.RD, self.std]
+
     @property
     def mu(self):
         return (self.r - self._initial_rating) / self._k
@@ -66,8 +138,146 @@ class _RatingGlicko:
         return f"<_RatingGlicko r={self.r:.1f}, RD={self.RD:.1f}, std={self.std:.4f}>"
 
 
+class _GlickoRatingState(RatingState):
+    """Glicko-2 ratings, including the partial data of the open rating
+    period.
+
+    A game belongs to the rating period ending after it, the periods
+    starting at midnight of the day of the first game. The official
+    ratings of the players are only computed once the period is closed,
+    i.e. when a game of a later period is applied.
+    """
+
+    def __init__(self, ranking, rating_period):
+        super().__init__(ranking)
+        self.rating_period = rating_period
+        self.origin = None
+        self.period = None
+        # player -> [mu, phi, std] official rating on the glicko-2 scale, at
+        # the onset of the open period for the players of that period
+        self.official = {}
+        # player -> index of the last period played; the RD increase of the
+        # periods without games is only applied when a player plays again
+        self.last_period = {}
+        # player -> [v_sum, delta_sum] for the players of the open period
+        self.open = {}
+
+    def _get_period(self, end_time):
+        if self.origin is None:
+            self.origin = end_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        return (end_time - self.origin) // self.rating_period + 1
+
+    def _close_period(self):
+        if not self.open:
+            return
+        players = list(self.open)
+        mu, phi, std = np.array([self.official[p] for p in players]).T
+        v_sum, delta_sum = np.array([self.open[p] for p in players]).T
+        new_mu, new_phi, new_std = _rate_period(mu, phi, std, v_sum, delta_sum, self.ranking.tau)
+        for p, rating in zip(players, zip(new_mu.tolist(), new_phi.tolist(), new_std.tolist())):
+            self.official[p] = list(rating)
+        self.open = {}
+
+    def _open_players(self, players):
+        """Opens the period for the players not already in it, from their
+        official rating increased by the RD increase of the periods they
+        missed."""
+        idle, nb_idle = [], []
+        for player in players:
+            if player in self.open:
+                continue
+            if player not in self.official:
+                default = self.ranking.get_default_rating()
+                self.official[player] = [default.mu, default.phi, default.std]
+            elif self.period - self.last_period[player] > 1:
+                idle.append(player)
+                nb_idle.append(self.period - self.last_period[player] - 1)
+            self.last_period[player] = self.period
+            self.open[player] = [0.0, 0.0]
+        if idle:
+            _, phi, std = np.array([self.official[p] for p in idle]).T
+            for p, new_phi in zip(idle, _inflate_phi(phi, std, np.array(nb_idle)).tolist()):
+                self.official[p][1] = new_phi
+
+    def _enter_period(self, period):
+        if self.period is None or period > self.period:
+            self._close_period()
+            self.period = period
+        elif period < self.period:
+            raise ValueError('Games must be applied in chronological order')
+
+    def _rate_game(self, winner, loser):
+        winner_rating, loser_rating = self.official[winner], self.official[loser]
+        return (
+            self._rate_player(winner_rating, loser_rating, 1, self.open[winner]),
+            self._rate_player(loser_rating, winner_rating, 0, self.open[loser]),
+        )
+
+    def _rate(self, winner, loser, end_time):
+        self._enter_period(self._get_period(end_time))
+        self._open_players((winner, loser))
+        return self._rate_game(winner, loser)
+
+    def apply_games(self, games):
+        """Same as `apply()` for a series of (winner, loser, end_time) games,
+        in a single pass over the rating periods: the players of a period are
+        all opened at once, and the periods without games are skipped.
+        Returns the pair of new ratings of every game."""
+        game_ratings = []
+        for period, period_games in groupby(games, key=lambda g: self._get_period(g[2])):
+            period_games = list(period_games)
+            self._enter_period(period)
+            self._open_players([p for winner, loser, _ in period_games for p in (winner, loser)])
+            for winner, loser, _ in period_games:
+                r0, r1 = self._rate_game(winner, loser)
+                self.ratings[winner] = (self.get_rating(winner), r0)
+                self.ratings[loser] = (self.get_rating(loser), r1)
+                game_ratings.append((r0, r1))
+            self.end_time = period_games[-1][2]
+        return game_ratings
+
+    @staticmethod
+    def _rate_player(rating, opponent_rating, outcome, sums):
+        mu, phi, std = rating
+        opp_mu, opp_phi, _ = opponent_rating
+        g = 1 / sqrt(1 + (3 * opp_phi ** 2) / (pi ** 2))
+        e = 1 / (1 + exp(-g * (mu - opp_mu)))
+        sums[0] += g ** 2 * e * (1 - e)
+        sums[1] += g * (outcome - e)
+        # We want a new rating after every game, so the intermediate rating
+        # is the one obtained from the games played so far in the rating
+        # period, the volatility being kept constant.
+        phi_k = 1 / sqrt(1 / (phi ** 2 + std ** 2) + sums[0])
+        mu_k = mu + phi_k ** 2 * sums[1]
+        return _RatingGlicko(_RatingGlicko.mu_to_rating(mu_k), _RatingGlicko.phi_to_RD(phi_k), std)
+
+    def to_json(self):
+        data = super().to_json()
+        data.update(
+            rating_period=self.rating_period.total_seconds(),
+            origin=self.origin.isoformat(' ') if self.origin else None,
+            period=self.period,
+            official=[[p, *rating, self.last_period[p]] for p, rating in self.official.items()],
+            open=[[p, *sums] for p, sums in self.open.items()],
+        )
+        return data
+
+    def load_json(self, data):
+        super().load_json(data)
+        self.rating_period = timedelta(seconds=data['rating_period'])
+        self.origin = datetime.fromisoformat(data['origin']) if data['origin'] else None
+        self.period = data['period']
+        self.official = {p: [mu, phi, std] for p, mu, phi, std, _ in data['official']}
+        self.last_period = {p: last_period for p, _, _, _, last_period in data['official']}
+        self.open = {p: [v_sum, delta_sum] for p, v_sum, delta_sum in data['open']}
+
+
 class RankingGlicko(RankingBase):
 
+    def __init__(self, rating_period=timedelta(days=3), tau=0.8):
+        self.rating_period = rating_period
+        self.tau = tau
+
     @staticmethod
     def compute_new_rating(
         rating,
@@ -167,11 +377,19 @@ class RankingGlicko(RankingBase):
         new_rating = _RatingGlicko(r0=new_r, RD=new_RD, std=new_std)
 
         if return_intermediate_ratings:
+            # The intermediate rating after each game is the rating obtained
+            # from the games played so far in the period, the volatility
+            # being kept constant.
             intermediate = []
-            R_ = rating.duplicate()
-            for r, o in zip(rating_opponents, outcomes):
-                R_ = RankingGlicko.rate_1vs1(R_, r, o, tau=tau, eps=eps)
-                intermediate.append(R_)
+            v_sum = delta_sum = 0.0
+            for opp, s in zip(rating_opponents, outcomes):
+                e = E(rating, opp)
+                v_sum += g(opp) ** 2 * e * (1 - e)
+                delta_sum += g(opp) * (s - e)
+                phi_k = 1 / sqrt(1 / (phi_star ** 2) + v_sum)
+                r = _RatingGlicko.mu_to_rating(rating.mu + phi_k ** 2 * delta_sum)
+                RD = _RatingGlicko.phi_to_RD(phi_k)
+                intermediate.append(_RatingGlicko(r0=r, RD=RD, std=rating.std))
             return new_rating, intermediate
 
         return new_rating
@@ -181,10 +399,16 @@ class RankingGlicko(RankingBase):
         return RankingGlicko.compute_new_rating(player, [opponent], [outcome], **kw)
 
     def record_result(self, winner_rating, loser_rating):
-        r0 = self.rate_1vs1(winner_rating, loser_rating, 1)
-        r1 = self.rate_1vs1(loser_rating, winner_rating, 0)
+        r0 = self.rate_1vs1(winner_rating, loser_rating, 1, tau=self.tau)
+        r1 = self.rate_1vs1(loser_rating, winner_rating, 0, tau=self.tau)
         return r0, r1
 
+    def win_probability(self, rating0, rating1):
+        # Expected score of the player against an opponent, accounting for
+        # the uncertainty of both ratings (Glickman, 1999)
+        g = 1 / sqrt(1 + 3 * (rating0.phi ** 2 + rating1.phi ** 2) / pi ** 2)
+        return 1 / (1 + exp(-g * (rating0.mu - rating1.mu)))
+
     @classmethod
     def get_default_rating(cls):
         # Use a lower RD than the upper limit of 350. We use a lower RD because
@@ -194,124 +418,16 @@ class RankingGlicko(RankingBase):
         # except a higher fluctuation in rating, at least initially.
         return _RatingGlicko(_RatingGlicko._initial_rating, std=0.1, RD=100)
 
-    def compute_ratings_from_series_of_games(
-        self,
-        games,
-        player_lookup,
-        rating_period=timedelta(days=3),
-    ):
-        """Computes the per-game rating of each involved player in `games`.
+    def rating_from_state(self, state):
+        r, RD, std = state
+        return _RatingGlicko(r, RD, std)
 
-        Returns:
-            a list of same length as `games`, where each elemnet is a pair of
-            `_RatingGlicko` instances.
-        """
+    def create_state(self):
+        return _GlickoRatingState(self, self.rating_period)
 
-        # (datetime, _Player) -> _RatingGlicko
-        # ... this is the 'official' ratings. They are provided every
-        # `rating_period`, and is the basis for rating calculation. Because a
-        # player expects to get a new rating for every game played, we need
-        # also to keep a collection of ratings by game. See below.
-        player_ratings_by_period = {}
-
-        def _previous_period_rating_for(player, current_period):
-            key = (player, current_period - rating_period)
-            if key not in player_ratings_by_period:
-                return RankingGlicko.get_default_rating()
-            return player_ratings_by_period[key]
-
-        # game -> (_RatingGlicko, _RatingGlicko)
-        # ... for `game.player0` and `game.player1` respectively
-        player_ratings_by_game = {}
-
-        def _group_games_by_player(games, player_lookup):
-            out = defaultdict(list)
-            for g in games:
-                out[player_lookup[g.player0]].append(g)
-                out[player_lookup[g.player1]].append(g)
-            return dict(out)
-
-        def _partition_games_in_rating_periods(games, start_time, rating_period):
-            out = defaultdict(list)
-            t = start_time
-            remaining = deque(sorted(games, key=lambda g: g.start_time))
-            while remaining:
-                while remaining and t > remaining[0].end_time:
-                    out[t].append(remaining.popleft())
-                t += rating_period
-                out[t] = []  # ensure we register a key for this rating period, too.
-            return dict(out)
-
-        def _get_opponent(game, player):
-            p0 = player_lookup[game.player0]
-            p1 = player_lookup[game.player1]
-            if p0 is player:
-                return p1
-            elif p1 is player:
-                return p0
-            raise ValueError("Expected `player` to be involved in the game.")
-
-        def _get_outcome_for(game, player):
-            """Return 1 if `player` won the game, otherwise 0."""
-            if player_lookup[game.player0] is player:
-                return 1
-            elif player_lookup[game.player1] is player:
-                return 0
-            raise ValueError("Expected `player` to be involved in the game.")
-
-        start_date = min(map(lambda g: g.end_time, games))
-        start_date = start_date.replace(hour=0, minute=0, second=0)
-
-        games_by_period = _partition_games_in_rating_periods(
-            games, start_date, rating_period
-        )
-        current_registered_players = set()
-
-        for period, G in games_by_period.items():
-            # TODO: if no games in particular period, we should still increase the RD.
-            # Currently, we assume there's at least one game per period.
-            groups = _group_games_by_player(G, player_lookup)
-            current_registered_players = current_registered_players.union(groups.keys())
-            for player in current_registered_players:
-                G_ = groups.get(player, [])
-                outcomes = [_get_outcome_for(g, player) for g in G_]
-                opponents = [_get_opponent(g, player) for g in G_]
-                opponent_ratings = [
-                    _previous_period_rating_for(o, period) for o in opponents
-                ]
-                current_rating = _previous_period_rating_for(player, period)
-                period - rating_period
-                new_rating, tmp = RankingGlicko.compute_new_rating(
-                    current_rating,
-                    opponent_ratings,
-                    outcomes,
-                    return_intermediate_ratings=True,
-                )
-                for g, r in zip(G_, tmp):
-                    player_ratings_by_game.setdefault(g, [None, None])
-                    if player_lookup[g.player0] is player:
-                        assert player_ratings_by_game[g][0] is None
-                        player_ratings_by_game[g][0] = r
-                    elif player_lookup[g.player1] is player:
-                        assert player_ratings_by_game[g][1] is None
-                        player_ratings_by_game[g][1] = r
-                    else:
-                        raise ValueError
-
-                # We update the actual `r` value of `new_rating` by using the
-                # last intermediate rating. Strictly speaking this is not
-                # valid, because glicko-2 computes the rating once every
-                # `rating_period`. However, we want a new rating after every
-                # game, so we simply use the last intermediate rating as the
-                # 'official rating'. But we keep RD and volatility constant
-                # (equal to the official rating) during calculation of the
-                # intermediate ratings.
-                if len(tmp):
-                    new_rating.r = tmp[-1].r
-
-                player_ratings_by_period[player, period] = new_rating
-
-        # The order of ratings must match the order of games. That's why we
-        # can't return `player_ratings_by_game.values()` directly, since
-        # they are not processed in the same order as `games` appear.
-        return [player_ratings_by_game[g] for g in games]
+    def compute_ratings_from_series_of_games(self, games, player_lookup, state=None):
+        if state is None:
+            state = self.create_state()
+        # The players of every game are only looked up once
+        games = [(player_lookup[g.player0], player_lookup[g.player1], g.end_time) for g in games]
+        return state.apply_games(games)
@@ -15,6 +15,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+from math import sqrt
+
 import trueskill
 
 from .abc import RankingBase
@@ -22,6 +24,8 @@ from .abc import RankingBase
 
 class _RatingTrueskill:
 
+    __slots__ = ('internal', '_env')
+
     def __init__(self, env, internal=None):
         self.internal = trueskill.Rating() if internal is None else internal
         self._env = env
@@ -35,11 +39,15 @@ class _RatingTrueskill:
         # XXX: needs more accuracy?
         return round(self.value * 100)
 
+    @property
+    def state(self):
+        return [self.internal.mu, self.internal.sigma]
+
 
 class RankingTrueskill(RankingBase):
 
-    def __init__(self):
-        self._env = trueskill.TrueSkill(draw_probability=0)
+    # The environment is immutable so it is shared by all the instances
+    _env = trueskill.TrueSkill(draw_probability=0)
 
     def record_result(self, winner_rating, loser_rating):
         r0, r1 = self._env.rate_1vs1(winner_rating.internal, loser_rating.internal)
@@ -47,6 +55,15 @@ class RankingTrueskill(RankingBase):
         r1 = _RatingTrueskill(self._env, r1)
         return r0, r1
 
+    def win_probability(self, rating0, rating1):
+        r0, r1 = rating0.internal, rating1.internal
+        c = sqrt(2 * self._env.beta ** 2 + r0.sigma ** 2 + r1.sigma ** 2)
+        return self._env.cdf((r0.mu - r1.mu) / c)
+
     @classmethod
     def get_default_rating(cls):
-        return _RatingTrueskill(cls()._env)
+        return _RatingTrueskill(cls._env)
+
+    def rating_from_state(self, state):
+        mu, sigma = state
+        return _RatingTrueskill(self._env, self._env.create_rating(mu, sigma))
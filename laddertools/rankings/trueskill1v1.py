@@ -0,0 +1,98 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from math import erfc, exp, pi, sqrt
+
+from .abc import RankingBase
+
+
+# Same default environment as the trueskill package
+_mu = 25.
+_sigma = _mu / 3
+_beta = _sigma / 2
+_tau = _sigma / 100
+
+_sqrt2 = sqrt(2)
+_inv_sqrt2pi = 1 / sqrt(2 * pi)
+
+
+def _v_w(t):
+    """Additive and multiplicative corrections of the mean and variance of
+    the winner, for a performance difference `t` (in units of `c`) and no
+    draw margin."""
+    if t < -37:
+        # Very unexpected result: the pdf and cdf are about to leave the
+        # range of normal floats, so use the asymptotic values
+        return -t, 1.
+    # erfc() keeps its precision in the lower tail, where 1 + erf() cancels
+    cdf = 0.5 * erfc(-t / _sqrt2)
+    v = _inv_sqrt2pi * exp(-0.5 * t * t) / cdf
+    return v, v * (v + t)
+
+
+class _RatingTrueskill1v1:
+
+    __slots__ = ('mu', 'sigma')
+
+    def __init__(self, mu=_mu, sigma=_sigma):
+        self.mu = mu
+        self.sigma = sigma
+
+    @property
+    def value(self):
+        # Conservative estimation, like `trueskill.TrueSkill.expose()`
+        return self.mu - 3 * self.sigma
+
+    @property
+    def display_value(self):
+        return round(self.value * 100)
+
+    @property
+    def state(self):
+        return [self.mu, self.sigma]
+
+
+class RankingTrueskill1v1(RankingBase):
+    """TrueSkill for 1v1 games without draw, updated in closed form instead
+    of going through the factor graph of the trueskill package."""
+
+    def record_result(self, winner_rating, loser_rating):
+        var0 = winner_rating.sigma ** 2 + _tau ** 2
+        var1 = loser_rating.sigma ** 2 + _tau ** 2
+        c2 = 2 * _beta ** 2 + var0 + var1
+        c = sqrt(c2)
+        v, w = _v_w((winner_rating.mu - loser_rating.mu) / c)
+        r0 = _RatingTrueskill1v1(
+            winner_rating.mu + var0 / c * v,
+            sqrt(var0 * (1 - var0 / c2 * w)),
+        )
+        r1 = _RatingTrueskill1v1(
+            loser_rating.mu - var1 / c * v,
+            sqrt(var1 * (1 - var1 / c2 * w)),
+        )
+        return r0, r1
+
+    def win_probability(self, rating0, rating1):
+        c = sqrt(2 * _beta ** 2 + rating0.sigma ** 2 + rating1.sigma ** 2)
+        return 0.5 * erfc((rating1.mu - rating0.mu) / c / _sqrt2)
+
+    @classmethod
+    def get_default_rating(cls):
+        return _RatingTrueskill1v1()
+
+    def rating_from_state(self, state):
+        return _RatingTrueskill1v1(*state)
@@ -20,7 +20,9 @@ import os
 import os.path as op
 import argparse
 import logging
+import mmap
 import struct
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
 from . import miniyaml
@@ -28,6 +30,8 @@ from . import miniyaml
 
 class GamePlayerInfo:
 
+    __slots__ = ('fingerprint', 'display_name', 'faction', 'selected_faction')
+
     def __init__(self, fingerprint, display_name, faction, selected_faction):
         self.fingerprint = fingerprint
         self.display_name = display_name
@@ -40,6 +44,8 @@ class GamePlayerInfo:
 
 class GameResult:
 
+    __slots__ = ('start_time', 'end_time', 'filename', 'player0', 'player1', 'map_uid', 'map_title')
+
     def __init__(self, start_time, end_time, filename, player0, player1, map_uid, map_title):
         self.start_time = start_time
         self.end_time = end_time
@@ -57,50 +63,79 @@ def _parse_date_fmt(date_string):
     return datetime.strptime(date_string, '%Y-%m-%d %H-%M-%S')
 
 
-def _parse_fmt(data, fmt):
-    n = struct.calcsize(fmt)
-    return struct.unpack('<' + fmt, data[:n])
+# Trailing metadata block layout:
+#   start marker, version, length - 4, YAML data, length, end marker
+_meta_header = struct.Struct('<iii')
+_meta_trailer = struct.Struct('<ii')
+
 
+_player_keys = (
+    'Name',
+    'Outcome',
+    'Fingerprint',
+    'Handicap',
+    'FactionName',
+    'DisplayFactionName',
+    'IsRandomFaction',
+    'OutcomeTimestampUtc',
+    'DisconnectFrame',
+)
 
-def _read_data_fmt(reader, fmt):
-    n = struct.calcsize(fmt)
-    data = reader.read(n)
-    assert len(data) == n
-    return _parse_fmt(data, fmt)
+# Only the game information actually used is extracted from the metadata,
+# which stops as soon as it's all found
+_game_info_paths = (
+    'Root.StartTimeUtc', 'Root.EndTimeUtc', 'Root.MapUid', 'Root.MapTitle', 'Player@0', 'Player@1',
+    *(f'Player@{i}.{key}' for i in range(2) for key in _player_keys),
+)
 
 
 def _parse_game_info(input_file):
-    # TODO: check file size
-    input_file.seek(-8, 2)
-    length, end_marker = _read_data_fmt(input_file, 'ii')
-    if end_marker != -2:
-        raise Exception(f'Invalid end marker {end_marker}')
-    input_file.seek(-(length + 16), 1)
-    start_marker, version = _read_data_fmt(input_file, 'ii')
-    if start_marker != -1:
-        raise Exception(f'Invalid start marker {start_marker}')
-    game_data = input_file.read(length)
-    length2, = _parse_fmt(game_data, 'i')
-    assert length2 == length - 4
-    game_yaml = game_data[4:]
-    return miniyaml.load(game_yaml)
+    file_size = os.fstat(input_file.fileno()).st_size
+    if file_size < _meta_header.size + _meta_trailer.size:
+        raise Exception(f'File too small to contain the game information ({file_size} bytes)')
+
+    # Only the pages of the trailing metadata block are actually read
+    with mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        length, end_marker = _meta_trailer.unpack_from(data, file_size - _meta_trailer.size)
+        if end_marker != -2:
+            raise Exception(f'Invalid end marker {end_marker}')
+        start = file_size - length - 16
+        if length < 4 or start < 0:
+            raise Exception(f'Invalid game information length {length}')
+        start_marker, version, length2 = _meta_header.unpack_from(data, start)
+        if start_marker != -1:
+            raise Exception(f'Invalid start marker {start_marker}')
+        assert length2 == length - 4
+        start += _meta_header.size
+        end = file_size - _meta_trailer.size
+
+        # Any extra player would come after the first two: the key of the
+        # last player node is looked up backward from the end of the block so
+        # that the extraction doesn't have to go through all of it
+        last_player = data.rfind(b'\nPlayer@', start, end) + 1
+        last_player = data[last_player:data.find(b':', last_player, end)].decode() if last_player else None
+
+        with memoryview(data)[start:end] as game_yaml:
+            return miniyaml.extract(game_yaml, _game_info_paths), last_player
 
 
 def get_result(filename):
 
     with open(filename, 'rb') as f:
-        game_info = _parse_game_info(f)
-
-        root_info = game_info['Root']
-        start_time = _parse_date_fmt(root_info['StartTimeUtc'])
-        end_time = _parse_date_fmt(root_info['EndTimeUtc'])
-        map_uid = root_info['MapUid']
-        map_title = root_info['MapTitle']
-
-        players = [k for k in game_info.keys() if k.startswith('Player@')]
-        if len(players) != 2:
-            raise Exception(f"game doesn't have 2 but {len(players)} players")
-        player0, player1 = [game_info[f'Player@{i}'] for i in range(2)]
+        game_info, last_player = _parse_game_info(f)
+
+        start_time = _parse_date_fmt(game_info['Root.StartTimeUtc'])
+        end_time = _parse_date_fmt(game_info['Root.EndTimeUtc'])
+        map_uid = game_info['Root.MapUid']
+        map_title = game_info['Root.MapTitle']
+
+        players = [p for p in ('Player@0', 'Player@1') if p in game_info]
+        if players != ['Player@0', 'Player@1'] or last_player != 'Player@1':
+            raise Exception("game doesn't have 2 players")
+        player0, player1 = [
+            {key: game_info[f'Player@{i}.{key}'] for key in _player_keys if f'Player@{i}.{key}' in game_info}
+            for i in range(2)
+        ]
         p0_name, p0_outcome, p0_fingerprint, p0_handicap = player0['Name'], player0['Outcome'], player0['Fingerprint'], int(player0.get('Handicap', 0))
         p1_name, p1_outcome, p1_fingerprint, p1_handicap = player1['Name'], player1['Outcome'], player1['Fingerprint'], int(player1.get('Handicap', 0))
 
@@ -168,28 +203,67 @@ def get_result(filename):
         return GameResult(start_time, end_time, filename, p0, p1, map_uid, map_title)
 
 
-def _log_result(filename):
+class ReplayReadError(str):
+    """Message of an error while reading a replay file, as opposed to an
+    invalid replay. Such an error may only be temporary."""
+
+
+def _try_get_result(filename):
     try:
-        result = get_result(filename)
+        return get_result(filename), None
+    except OSError as e:
+        return None, ReplayReadError(e)
     except Exception as e:
-        logging.error(f'{op.basename(filename)}: {e}')
-    else:
-        logging.info(result)
+        return None, str(e)
 
 
-def _main(args):
-    logging.basicConfig(level='INFO', format='%(message)s')
-    for filename in sorted(args.replays):
+def positive_int(value):
+    """Argument type of the number of parallel jobs."""
+    try:
+        n = int(value)
+    except ValueError:
+        n = 0
+    if n < 1:
+        raise argparse.ArgumentTypeError(f'invalid positive integer {value!r}')
+    return n
+
+
+def get_results(filenames, jobs=1):
+    """Yields a (result, error) pair for every replay, in the same order as
+    `filenames`. With more than one job, the replays are parsed in a pool of
+    processes."""
+
+    if jobs == 1 or len(filenames) < 2:
+        yield from map(_try_get_result, filenames)
+        return
+    chunksize = max(1, min(64, len(filenames) // (jobs * 4)))
+    with ProcessPoolExecutor(jobs) as executor:
+        yield from executor.map(_try_get_result, filenames, chunksize=chunksize)
+
+
+def _get_filenames(replays):
+    for filename in sorted(replays):
         if op.isdir(filename):
             for root, dirs, files in os.walk(filename):
                 for name in files:
-                    _log_result(op.join(root, name))
+                    yield op.join(root, name)
+        else:
+            yield filename
+
+
+def _main(args):
+    logging.basicConfig(level='INFO', format='%(message)s')
+    filenames = list(_get_filenames(args.replays))
+    for filename, (result, error) in zip(filenames, get_results(filenames, args.jobs)):
+        if error is not None:
+            logging.error(f'{op.basename(filename)}: {error}')
         else:
-            _log_result(filename)
+            logging.info(result)
 
 
 def run():
     parser = argparse.ArgumentParser()
+    parser.add_argument('-j', '--jobs', type=positive_int, default=1, help='number of replays parsed in parallel')
     parser.add_argument('replays', nargs='+')
     args = parser.parse_args()
     _main(args)
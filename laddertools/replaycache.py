@@ -0,0 +1,171 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import os.path as op
+import sqlite3
+from datetime import datetime
+
+from . import replay
+from .replay import GamePlayerInfo, GameResult
+
+
+# Must be bumped every time the parsing of the replays changes so that the
+# cached results are invalidated
+_version = 1
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS replays (
+	filename              TEXT PRIMARY KEY,
+	size                  INTEGER NOT NULL,
+	mtime_ns              INTEGER NOT NULL,
+	error                 TEXT,
+	start_time            TEXT,
+	end_time              TEXT,
+	fingerprint_0         TEXT,
+	fingerprint_1         TEXT,
+	name_0                TEXT,
+	name_1                TEXT,
+	faction_0             TEXT,
+	faction_1             TEXT,
+	selected_faction_0    TEXT,
+	selected_faction_1    TEXT,
+	map_uid               TEXT,
+	map_title             TEXT
+);
+'''
+
+
+class CachedReplayError(Exception):
+    """Parsing error of a replay, obtained from the cache."""
+
+
+class ReplayCache:
+    """On-disk cache of the replays results (or parsing errors).
+
+    Replays never change once written by the server, so a replay is
+    identified by its absolute path, size and modification time, and is only
+    parsed again if any of them changes.
+    """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, timeout=30)
+        version, = self._conn.execute('PRAGMA user_version').fetchone()
+        if version != _version:
+            self._conn.execute('DROP TABLE IF EXISTS replays')
+            self._conn.execute(f'PRAGMA user_version = {_version}')
+        self._conn.executescript(_schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+    @staticmethod
+    def _sql_row(filename, size, mtime_ns, result):
+        p0, p1 = result.player0, result.player1
+        return (
+            filename, size, mtime_ns, None,
+            result.start_time.isoformat(' '),
+            result.end_time.isoformat(' '),
+            p0.fingerprint, p1.fingerprint,
+            p0.display_name, p1.display_name,
+            p0.faction, p1.faction,
+            p0.selected_faction, p1.selected_faction,
+            result.map_uid, result.map_title,
+        )
+
+    @staticmethod
+    def _result_from_row(filename, row):
+        (start_time, end_time, fp0, fp1, name0, name1, faction0, faction1,
+         selected_faction0, selected_faction1, map_uid, map_title) = row
+        return GameResult(
+            datetime.fromisoformat(start_time),
+            datetime.fromisoformat(end_time),
+            filename,
+            GamePlayerInfo(fp0, name0, faction0, selected_faction0),
+            GamePlayerInfo(fp1, name1, faction1, selected_faction1),
+            map_uid,
+            map_title,
+        )
+
+    def get(self, filename):
+        """Returns the cached result of the replay, or None if the replay
+        isn't cached yet, or can not be accessed (the error is then reported
+        when the replay is parsed).
+
+        Raises `CachedReplayError` if a previous parsing of the replay failed.
+        """
+
+        filename = op.abspath(filename)
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        row = self._conn.execute('SELECT * FROM replays WHERE filename=?', (filename,)).fetchone()
+        if row is None or row[1:3] != (st.st_size, st.st_mtime_ns):
+            return None
+        error = row[3]
+        if error is not None:
+            raise CachedReplayError(error)
+        return self._result_from_row(filename, row[4:])
+
+    def add(self, filename, result=None, error=None):
+        """Records the result of a replay, or its parsing error. Nothing is
+        recorded if the replay could not be read (`replay.ReplayReadError`)
+        or can not be accessed anymore, since it may only be temporary."""
+
+        if isinstance(error, replay.ReplayReadError):
+            return
+        filename = op.abspath(filename)
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return
+        if result is None:
+            row = (filename, st.st_size, st.st_mtime_ns, error) + (None,) * 12
+        else:
+            row = self._sql_row(filename, st.st_size, st.st_mtime_ns, result)
+        self._conn.execute('INSERT OR REPLACE INTO replays VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', row)
+
+    def get_result(self, filename):
+        """Same as `replay.get_result()`, but only parses the replay if it
+        isn't cached yet."""
+
+        result = self.get(filename)
+        if result is not None:
+            return result
+        try:
+            result = replay.get_result(filename)
+        except OSError:
+            raise
+        except Exception as e:
+            self.add(filename, error=str(e))
+            raise
+        self.add(filename, result)
+        return result
+
+
+def get_default_cache_path(database):
+    """The cache is shared by all the databases of the same directory since
+    they are typically built from the same replays."""
+    return op.join(op.dirname(op.abspath(database)), 'replays-cache.sqlite3')
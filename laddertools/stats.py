@@ -0,0 +1,163 @@
+#
+# Copyright (C) 2021
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import itertools
+import json
+from datetime import date, timedelta
+
+import numpy as np
+
+
+global_stats_tables = ('stats_summary', 'stats_factions', 'stats_maps', 'stats_daily_activity')
+player_stats_tables = ('player_stats', 'player_rating_series')
+stats_tables = global_stats_tables + player_stats_tables
+
+# The first games of a player are not part of its rating series, and the
+# remaining ratings are rescaled to a fixed number of data points
+rating_series_skipped = 10
+rating_series_datapoints = 50
+
+
+def _player_outcomes(players=None):
+    """Subquery of every game of the players (all of them by default, or a
+    subquery of their profile ids), from their point of view."""
+    where0 = '' if players is None else f'WHERE profile_id0 IN {players}'
+    where1 = '' if players is None else f'WHERE profile_id1 IN {players}'
+    return f'''(
+    SELECT profile_id0 AS profile_id, 1 AS won, rating_0 AS rating, selected_faction_0 AS faction,
+           start_time, end_time, hash, map_title
+    FROM outcomes {where0}
+    UNION ALL
+    SELECT profile_id1 AS profile_id, 0 AS won, rating_1 AS rating, selected_faction_1 AS faction,
+           start_time, end_time, hash, map_title
+    FROM outcomes {where1}
+)'''
+
+
+# Players of the outcomes ending at or after a given time
+_updated_players = '''(
+    SELECT profile_id0 FROM outcomes WHERE end_time >= :from_time
+    UNION
+    SELECT profile_id1 FROM outcomes WHERE end_time >= :from_time
+)'''
+
+
+def _get_daily_activity(c):
+    rows = c.execute('SELECT date(end_time) AS day, COUNT(*) FROM outcomes GROUP BY day ORDER BY day').fetchall()
+    if not rows:
+        return []
+    counts = dict(rows)
+    start_date = date.fromisoformat(rows[0][0])
+    nb_days = (max(date.today(), date.fromisoformat(rows[-1][0])) - start_date).days
+    days = [(start_date + timedelta(n)).strftime('%Y-%m-%d') for n in range(nb_days + 1)]
+    return [(day, counts.get(day, 0)) for day in days]
+
+
+def update_global_stats(c, new_outcomes=True):
+    """Computes the aggregates of all the outcomes displayed by the global
+    stats page, so that it doesn't have to on every request.
+
+    Without new outcomes since the last update, only the number of players
+    is updated (the bans may have changed).
+    """
+
+    if not new_outcomes and c.execute('SELECT 1 FROM stats_summary').fetchone():
+        c.execute('UPDATE stats_summary SET nb_players = (SELECT COUNT(*) FROM players WHERE NOT banned)')
+        return
+
+    for table in global_stats_tables:
+        c.execute(f'DELETE FROM {table}')
+
+    c.execute('''
+        INSERT INTO stats_summary
+        SELECT
+            (SELECT COUNT(*) FROM outcomes),
+            (SELECT COUNT(*) FROM players WHERE NOT banned),
+            (SELECT strftime('%M:%S', AVG(julianday(end_time) - julianday(start_time))) FROM outcomes)
+        ''')
+    c.execute('''
+        INSERT INTO stats_factions
+        SELECT faction, COUNT(*) FROM (
+            SELECT selected_faction_0 AS faction FROM outcomes
+            UNION ALL
+            SELECT selected_faction_1 AS faction FROM outcomes
+        )
+        GROUP BY faction
+        ''')
+    c.execute('INSERT INTO stats_maps SELECT map_title, COUNT(*) FROM outcomes GROUP BY map_title')
+    c.executemany('INSERT INTO stats_daily_activity VALUES (?,?)', _get_daily_activity(c))
+
+
+def _scaled(a, m):
+    n = len(a)
+    nr = range(n)
+    mr = [x * n / m for x in range(m)]
+    return [round(x) for x in np.interp(mr, nr, a)]
+
+
+def _get_rating_series(c, player_outcomes, params):
+    rows = c.execute(f'''
+        SELECT profile_id, rating FROM {player_outcomes}
+        ORDER BY profile_id, end_time, hash''', params)
+    series = []
+    for profile_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+        ratings = [rating for _, rating in group][rating_series_skipped:]
+        if ratings:
+            series += [(profile_id, point, r) for point, r in enumerate(_scaled(ratings, rating_series_datapoints))]
+    return series
+
+
+def update_player_stats(c, from_time=None):
+    """Computes the aggregates of the outcomes of the players displayed by
+    their profile page.
+
+    If `from_time` is specified, only the players of the outcomes ending at
+    or after that time are updated, since the other ones didn't change.
+    """
+
+    if from_time is not None and not c.execute('SELECT 1 FROM player_stats').fetchone():
+        from_time = None
+    players = None if from_time is None else _updated_players
+    player_outcomes = _player_outcomes(players)
+    params = dict(from_time=from_time)
+
+    where = '' if players is None else f'WHERE profile_id IN {players}'
+    for table in player_stats_tables:
+        c.execute(f'DELETE FROM {table} {where}', params)
+
+    factions = {}
+    for profile_id, faction, count in c.execute(f'''
+            SELECT profile_id, faction, COUNT(*) FROM {player_outcomes}
+            GROUP BY profile_id, faction''', params):
+        factions.setdefault(profile_id, []).append((faction, count))
+
+    maps = {}
+    for profile_id, map_title, wins, losses in c.execute(f'''
+            SELECT profile_id, map_title, SUM(won), SUM(NOT won) FROM {player_outcomes}
+            GROUP BY profile_id, map_title''', params):
+        maps.setdefault(profile_id, []).append((map_title, wins, losses))
+
+    durations = c.execute(f'''
+        SELECT profile_id, strftime('%M:%S', AVG(julianday(end_time) - julianday(start_time)))
+        FROM {player_outcomes}
+        GROUP BY profile_id''', params).fetchall()
+
+    c.executemany('INSERT INTO player_stats VALUES (?,?,?,?)', [
+        (profile_id, avg_duration, json.dumps(factions[profile_id]), json.dumps(maps[profile_id]))
+        for profile_id, avg_duration in durations
+    ])
+    c.executemany('INSERT INTO player_rating_series VALUES (?,?,?)', _get_rating_series(c, player_outcomes, params))
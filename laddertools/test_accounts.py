@@ -0,0 +1,121 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from .accounts import INVALID, TRANSIENT, AccountResolver
+
+
+_accounts = {f'fp{i}': (100 + i, f'player{i}') for i in range(20)}
+
+
+class _AccountHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_GET(self):
+        fingerprint = self.path.rsplit('/', 1)[-1]
+        self.server.connections.add(self.client_address)
+        if fingerprint == 'fp-mismatch':
+            account = (1, 'mismatch')
+            fingerprint = 'other'
+        else:
+            account = _accounts.get(fingerprint)
+        if account is None:
+            data = b'Error: Unknown fingerprint\n'
+        else:
+            profile_id, name = account
+            data = (
+                'Player:\n'
+                f'\tFingerprint: {fingerprint}\n'
+                f'\tProfileID: {profile_id}\n'
+                f'\tProfileName: {name}\n'
+                '\tAvatar:\n'
+                f'\t\tSrc: https://example.com/{name}.png\n'
+            ).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def account_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _AccountHandler)
+    server.connections = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_resolve_accounts(account_server):
+    port = account_server.server_address[1]
+    resolver = AccountResolver(url=f'http://127.0.0.1:{port}/openra/info/{{fingerprint}}', jobs=4, rate=0)
+
+    accounts_db = {'fp0': (1, 'cached', '')}
+    fingerprints = list(_accounts) + ['fp0', 'fp-unknown', 'fp-mismatch']
+    resolver.resolve(accounts_db, fingerprints)
+
+    assert accounts_db.pop('fp0') == (1, 'cached', '')
+    assert accounts_db.pop('fp-unknown') is None
+    assert accounts_db.pop('fp-mismatch') is None
+    assert accounts_db == {
+        fp: (pid, name, f'https://example.com/{name}.png')
+        for fp, (pid, name) in _accounts.items() if fp != 'fp0'
+    }
+    # One kept-alive connection per job
+    assert len(account_server.connections) == 4
+
+
+def test_resolve_accounts_rate_limit(account_server):
+    port = account_server.server_address[1]
+    resolver = AccountResolver(url=f'http://127.0.0.1:{port}/openra/info/{{fingerprint}}', jobs=4, rate=50)
+
+    accounts_db = {}
+    start = time.monotonic()
+    resolver.resolve(accounts_db, list(_accounts))
+    assert time.monotonic() - start >= (len(_accounts) - 1) / 50
+    assert None not in accounts_db.values()
+
+
+def test_resolve_accounts_unreachable():
+    resolver = AccountResolver(url='http://127.0.0.1:1/openra/info/{fingerprint}', timeout=1)
+    accounts_db = {}
+    failures = {}
+    resolver.resolve(accounts_db, ['fp0', 'fp1'], failures)
+    assert accounts_db == {'fp0': None, 'fp1': None}
+    assert failures.keys() == {'fp0', 'fp1'}
+    assert all(f[1:3] == (1, TRANSIENT) for f in failures.values())
+
+
+def test_resolve_accounts_retry(account_server):
+    port = account_server.server_address[1]
+    resolver = AccountResolver(url=f'http://127.0.0.1:{port}/openra/info/{{fingerprint}}', rate=0,
+                               retry_delay=100, invalid_retry_delay=-1)
+
+    now = int(time.time())
+    failures = {
+        'fp0': (now - 50, 1, TRANSIENT, 'timeout'),     # retried in 50s
+        'fp1': (now - 150, 1, TRANSIENT, 'timeout'),    # due
+        'fp2': (now - 150, 2, TRANSIENT, 'timeout'),    # backoff: retried in 50s
+        'fp3': (now - 10**6, 1, INVALID, 'Error'),      # never retried
+    }
+    accounts_db = {}
+    resolver.resolve(accounts_db, ['fp0', 'fp1', 'fp2', 'fp3', 'fp-unknown'], failures)
+
+    assert accounts_db['fp0'] is None
+    assert accounts_db['fp1'] == (101, 'player1', 'https://example.com/player1.png')
+    assert accounts_db['fp2'] is None
+    assert accounts_db['fp3'] is None
+    assert accounts_db['fp-unknown'] is None
+    assert 'fp1' not in failures
+    assert failures['fp0'] == (now - 50, 1, TRANSIENT, 'timeout')
+    assert failures['fp-unknown'][1:3] == (1, INVALID)
+    # Only fp1 and fp-unknown were queried
+    assert len(account_server.connections) == 2
@@ -0,0 +1,64 @@
+import sqlite3
+from argparse import ArgumentTypeError
+from datetime import timedelta
+from math import log
+
+import pytest
+
+from . import backtest
+
+
+def test_metrics():
+    predictions = [(0.8, 3), (0.5, 3), (0.25, 3), (0.9, 0)]
+    metrics = backtest.get_metrics(predictions, min_games=1)
+    assert metrics['games'] == 3
+    assert metrics['log_loss'] == pytest.approx(-(log(0.8) + log(0.5) + log(0.25)) / 3)
+    assert metrics['brier'] == pytest.approx((0.2 ** 2 + 0.5 ** 2 + 0.75 ** 2) / 3)
+    assert metrics['accuracy'] == pytest.approx(1.5 / 3)
+    assert backtest.get_metrics(predictions, min_games=4)['games'] == 0
+
+
+@pytest.mark.parametrize('name', ['trueskill1v1', 'elo', 'glicko'])
+def test_backtest_synthetic(name):
+    games = backtest.generate_games(3000, 50)
+    (kwargs, ranking), = backtest.get_configurations(name, [])
+    metrics = backtest.backtest(ranking, games, min_games=10)
+    assert metrics['games_per_sec'] > 0
+    assert metrics['peak_memory'] > 0
+    # Better than a coin flip on games between established players
+    assert metrics['accuracy'] > 0.6
+    assert metrics['brier'] < 0.25
+    assert metrics['log_loss'] < log(2)
+
+
+def test_sweep():
+    sweeps = [
+        backtest.parse_sweep('k=16,32'),
+        backtest.parse_sweep('tau=0.5,0.8'),
+        backtest.parse_sweep('rating_period=1,7'),
+    ]
+    elo = list(backtest.get_configurations('elo', sweeps))
+    assert [kwargs for kwargs, _ in elo] == [dict(k=16), dict(k=32)]
+    assert [ranking._k for _, ranking in elo] == [16, 32]
+    glicko = list(backtest.get_configurations('glicko', sweeps))
+    assert [(r.tau, r.rating_period) for _, r in glicko] == [
+        (0.5, timedelta(days=1)), (0.5, timedelta(days=7)),
+        (0.8, timedelta(days=1)), (0.8, timedelta(days=7)),
+    ]
+    assert len(list(backtest.get_configurations('trueskill1v1', sweeps))) == 1
+    with pytest.raises(ArgumentTypeError):
+        backtest.parse_sweep('k')
+
+
+def test_load_games(tmp_path):
+    database = str(tmp_path / 'db.sqlite3')
+    conn = sqlite3.connect(database)
+    conn.execute('CREATE TABLE outcomes (profile_id0 INTEGER, profile_id1 INTEGER, end_time TEXT)')
+    conn.executemany('INSERT INTO outcomes VALUES (?,?,?)', [
+        (2, 1, '2021-03-02 10:00:00'),
+        (1, 2, '2021-03-01 10:00:00'),
+    ])
+    conn.commit()
+    conn.close()
+    games = backtest.load_games(database)
+    assert [(g.player0, g.player1, g.end_time.day) for g in games] == [(1, 2, 1), (2, 1, 2)]
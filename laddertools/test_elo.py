@@ -0,0 +1,49 @@
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from .rankings.abc import RankingBase
+from .rankings.elo import RankingELO
+
+
+def _get_games(nb_players, nb_games, seed):
+    rng = random.Random(seed)
+    # Skewed activity, as on the ladder
+    weights = [1 / (i + 1) for i in range(nb_players)]
+    games = []
+    for i in range(nb_games):
+        p0, p1 = rng.choices(range(nb_players), weights, k=2)
+        if p0 == p1:
+            p1 = (p0 + 1) % nb_players
+        end_time = datetime(2021, 3, 1) + timedelta(hours=i)
+        games.append(SimpleNamespace(player0=p0, player1=p1, end_time=end_time))
+    return games
+
+
+@pytest.mark.parametrize('nb_players', [2, 5, 100])
+def test_elo_series(nb_players):
+    games = _get_games(nb_players, 2000, seed=nb_players)
+    lookup = {i: f'player{i}' for i in range(nb_players)}
+    ranking = RankingELO()
+    state = ranking.create_state()
+    state.ratings['player0'] = (state.get_rating('player0'), ranking.rating_from_state([1200.5]))
+    expected_state = ranking.load_state(state.to_json())
+
+    ratings = ranking.compute_ratings_from_series_of_games(games, lookup, state)
+    expected = RankingBase.compute_ratings_from_series_of_games(ranking, games, lookup, expected_state)
+
+    assert len(ratings) == len(expected) == len(games)
+    for (r0, r1), (e0, e1) in zip(ratings, expected):
+        assert (r0.value, r1.value) == (e0.value, e1.value)
+
+    assert state.end_time == expected_state.end_time == games[-1].end_time
+    assert state.ratings.keys() == expected_state.ratings.keys()
+    for player, (prv, cur) in state.ratings.items():
+        expected_prv, expected_cur = expected_state.ratings[player]
+        assert (prv.value, cur.value) == (expected_prv.value, expected_cur.value)
+
+
+def test_elo_series_empty():
+    assert RankingELO().compute_ratings_from_series_of_games([], {}) == []
@@ -1,5 +1,9 @@
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
 import pytest
-from .rankings.glicko import RankingGlicko, _RatingGlicko
+from .rankings.glicko import RankingGlicko, _RatingGlicko, _inflate_phi, _rate_period
 
 import numpy
 
@@ -29,3 +33,127 @@ def test_glicko_empty_period_will_increase_RD():
     new_rating = RankingGlicko.compute_new_rating(me, opponents, outcomes)
     assert new_rating.RD == 350
     assert new_rating.r == me.r  # should remain unchanged... Only increase RD
+
+
+def test_glicko_batched_period():
+    rng = numpy.random.default_rng(0)
+    nb_players = 50
+    r = rng.uniform(1200, 1800, nb_players)
+    RD = rng.uniform(30, 350, nb_players)
+    std = rng.uniform(0.04, 0.2, nb_players)
+    ratings = [_RatingGlicko(*state) for state in zip(r, RD, std)]
+    games = [rng.choice(nb_players, 2, replace=False) for _ in range(300)]
+
+    expected = []
+    v_sum = numpy.zeros(nb_players)
+    delta_sum = numpy.zeros(nb_players)
+    for player, rating in enumerate(ratings):
+        opponents, outcomes = [], []
+        for p0, p1 in games:
+            if player in (p0, p1):
+                opponents.append(ratings[p1 if player == p0 else p0])
+                outcomes.append(int(player == p0))
+        for opp, s in zip(opponents, outcomes):
+            g = 1 / numpy.sqrt(1 + 3 * opp.phi ** 2 / numpy.pi ** 2)
+            e = 1 / (1 + numpy.exp(-g * (rating.mu - opp.mu)))
+            v_sum[player] += g ** 2 * e * (1 - e)
+            delta_sum[player] += g * (s - e)
+        expected.append(RankingGlicko.compute_new_rating(rating, opponents, outcomes))
+
+    mu = numpy.array([rating.mu for rating in ratings])
+    phi = numpy.array([rating.phi for rating in ratings])
+    new_mu, new_phi, new_std = _rate_period(mu, phi, std, v_sum, delta_sum)
+    numpy.testing.assert_allclose(_RatingGlicko.mu_to_rating(new_mu), [e.r for e in expected], rtol=1e-12)
+    numpy.testing.assert_allclose(_RatingGlicko.phi_to_RD(new_phi), [e.RD for e in expected], rtol=1e-12)
+    numpy.testing.assert_allclose(new_std, [e.std for e in expected], rtol=1e-9)
+
+
+def test_glicko_batched_paper_example():
+    me = _RatingGlicko(1500, 200, .06)
+    opponents = [
+        _RatingGlicko(1400, 30, .06),
+        _RatingGlicko(1550, 100, .06),
+        _RatingGlicko(1700, 300, .06),
+    ]
+    ratings = [me] + opponents
+    mu = numpy.array([r.mu for r in ratings])
+    phi = numpy.array([r.phi for r in ratings])
+    std = numpy.array([r.std for r in ratings])
+
+    g = 1 / numpy.sqrt(1 + 3 * phi[1:] ** 2 / numpy.pi ** 2)
+    e = 1 / (1 + numpy.exp(-g * (mu[0] - mu[1:])))
+    outcomes = numpy.array([1, 0, 0])
+    v_sum = numpy.array([numpy.sum(g ** 2 * e * (1 - e))])
+    delta_sum = numpy.array([numpy.sum(g * (outcomes - e))])
+
+    new_mu, new_phi, new_std = _rate_period(mu[:1], phi[:1], std[:1], v_sum, delta_sum, tau=0.5, eps=1e-6)
+    numpy.testing.assert_almost_equal(1464.06, _RatingGlicko.mu_to_rating(new_mu[0]), decimal=2)
+    numpy.testing.assert_almost_equal(151.52, _RatingGlicko.phi_to_RD(new_phi[0]), decimal=2)
+    numpy.testing.assert_almost_equal(0.05999, new_std[0], decimal=5)
+
+
+@pytest.mark.parametrize('RD, std', [(50, 0.06), (100, 0.1), (340, 0.2), (350, 0.06)])
+def test_glicko_lazy_RD_increase(RD, std):
+    rating = _RatingGlicko(1500, RD, std)
+    for nb_periods in range(1, 200):
+        rating = RankingGlicko.compute_new_rating(rating, [], [])
+        phi = _inflate_phi(numpy.array([RD / _RatingGlicko._k]), numpy.array([std]), nb_periods)
+        numpy.testing.assert_allclose(_RatingGlicko.phi_to_RD(phi[0]), rating.RD, rtol=1e-12)
+
+
+def _get_games(nb_players, nb_games, seed):
+    rng = numpy.random.default_rng(seed)
+    end_time = datetime(2021, 3, 1, 12)
+    games = []
+    for _ in range(nb_games):
+        # Some long idle stretches
+        end_time += timedelta(hours=float(rng.exponential(20)))
+        p0, p1 = rng.choice(nb_players, 2, replace=False)
+        games.append(SimpleNamespace(player0=int(p0), player1=int(p1), end_time=end_time))
+    return games
+
+
+def test_glicko_state_resume():
+    games = _get_games(20, 500, seed=0)
+    lookup = {i: i for i in range(20)}
+    ranking = RankingGlicko()
+
+    state = ranking.create_state()
+    expected = ranking.compute_ratings_from_series_of_games(games, lookup, state)
+
+    ratings = []
+    resumed = ranking.create_state()
+    for n in range(0, len(games), 37):
+        resumed = ranking.load_state(json.loads(json.dumps(resumed.to_json())))
+        ratings += ranking.compute_ratings_from_series_of_games(games[n:n + 37], lookup, resumed)
+
+    assert [(r0.state, r1.state) for r0, r1 in ratings] == [(r0.state, r1.state) for r0, r1 in expected]
+    assert resumed.to_json() == state.to_json()
+    assert resumed.end_time == games[-1].end_time
+
+
+def test_glicko_single_pass():
+    games = _get_games(30, 400, seed=2)
+    # Idle stretch of several years in the middle
+    for game in games[200:]:
+        game.end_time += timedelta(days=2000)
+    lookup = {i: i for i in range(30)}
+    ranking = RankingGlicko()
+
+    state = ranking.create_state()
+    ratings = ranking.compute_ratings_from_series_of_games(games, lookup, state)
+
+    applied = ranking.create_state()
+    expected = [applied.apply(g.player0, g.player1, g.end_time) for g in games]
+
+    assert [(r0.state, r1.state) for r0, r1 in ratings] == [(r0.state, r1.state) for r0, r1 in expected]
+    assert state.to_json() == applied.to_json()
+
+
+def test_glicko_state_order():
+    games = _get_games(5, 10, seed=1)
+    ranking = RankingGlicko()
+    state = ranking.create_state()
+    state.apply(0, 1, games[-1].end_time)
+    with pytest.raises(ValueError):
+        state.apply(0, 1, games[0].end_time)
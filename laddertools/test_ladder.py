@@ -0,0 +1,351 @@
+import os
+import os.path as op
+import sqlite3
+from argparse import ArgumentTypeError, Namespace
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from . import ladder, replay
+from .ranking import ranking_systems
+from .stats import stats_tables
+from .utils import filter_period_files, get_period_start
+
+
+_players = [(f'player{i}', f'fp{i}') for i in range(6)]
+
+
+def _create_db(path):
+    conn = sqlite3.connect(path)
+    with open(op.join(op.dirname(ladder.__file__), 'ladder.sql')) as f:
+        conn.executescript(f.read())
+    accounts = [(fp, 1000 + i, name, '') for i, (name, fp) in enumerate(_players)]
+    conn.executemany('INSERT INTO accounts VALUES (?,?,?,?)', accounts)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _run(database, replays, ranking, incremental, targets=None, period=None, bans_file=None):
+    ladder._main(Namespace(
+        database=database,
+        targets=targets,
+        schema=op.join(op.dirname(ladder.__file__), 'ladder.sql'),
+        ranking=ranking.split('+'),
+        period=period,
+        bans_file=bans_file,
+        incremental=incremental,
+        cache=None,
+        jobs=1,
+        account_jobs=1,
+        account_rate=0,
+        account_timeout=1,
+        account_retry_delay=600,
+        account_invalid_retry_delay=-1,
+        replays=replays,
+    ))
+
+
+def _tracing_ladder(executed):
+    """Ladder class recording the SQL statements of its update."""
+
+    class _TracingLadder(ladder._Ladder):
+
+        def update(self, *args):
+            self.conn.set_trace_callback(executed.append)
+            super().update(*args)
+
+    return _TracingLadder
+
+
+def _dump(database):
+    conn = sqlite3.connect(database)
+    players = conn.execute('SELECT * FROM players ORDER BY profile_id').fetchall()
+    outcomes = conn.execute('SELECT * FROM outcomes ORDER BY end_time').fetchall()
+    conn.close()
+    return players, outcomes
+
+
+def _dump_stats(database):
+    conn = sqlite3.connect(database)
+    stats = {table: conn.execute(f'SELECT * FROM {table} ORDER BY 1, 2').fetchall() for table in stats_tables}
+    conn.close()
+    return stats
+
+
+def _write_replays(tmp_path, write_replay, days):
+    replays = []
+    for day in days:
+        winner = _players[day % len(_players)]
+        loser = _players[(day * 7 + 1) % len(_players)]
+        if winner == loser:
+            loser = _players[(day + 1) % len(_players)]
+        start_time = datetime(2021, 3, 1) + timedelta(days=day)
+        filename = str(tmp_path / f'replay-{day:03d}.orarep')
+        replays.append(write_replay(filename, start_time, winner, loser))
+    return replays
+
+
+@pytest.mark.parametrize('ranking', ['trueskill', 'trueskill1v1', 'elo', 'glicko'])
+@pytest.mark.parametrize('late_days', [range(20, 30), range(5, 30, 5)])
+def test_incremental_update(tmp_path, write_replay, ranking, late_days):
+    early_days = [d for d in range(30) if d not in late_days]
+    early_replays = _write_replays(tmp_path, write_replay, early_days)
+    late_replays = _write_replays(tmp_path, write_replay, late_days)
+
+    full_db = _create_db(str(tmp_path / 'full.sqlite3'))
+    _run(full_db, early_replays + late_replays, ranking, incremental=False)
+
+    incremental_db = _create_db(str(tmp_path / 'incremental.sqlite3'))
+    _run(incremental_db, early_replays, ranking, incremental=True)
+    _run(incremental_db, early_replays + late_replays, ranking, incremental=True)
+    _run(incremental_db, early_replays + late_replays, ranking, incremental=True)
+
+    full_players, full_outcomes = _dump(full_db)
+    incremental_players, incremental_outcomes = _dump(incremental_db)
+    assert len(full_outcomes) == 30
+    assert incremental_outcomes == full_outcomes
+    assert incremental_players == full_players
+    assert _dump_stats(incremental_db) == _dump_stats(full_db)
+
+
+def test_missing_checkpoint(tmp_path, write_replay):
+    early_replays = _write_replays(tmp_path, write_replay, range(20))
+    late_replays = _write_replays(tmp_path, write_replay, range(20, 30))
+
+    full_db = _create_db(str(tmp_path / 'full.sqlite3'))
+    _run(full_db, early_replays + late_replays, 'glicko', incremental=False)
+
+    incremental_db = _create_db(str(tmp_path / 'incremental.sqlite3'))
+    _run(incremental_db, early_replays, 'glicko', incremental=True)
+    conn = sqlite3.connect(incremental_db)
+    assert conn.execute('SELECT end_time FROM rating_checkpoint').fetchall() == [('2021-03-20 00:15:00',)]
+    conn.execute('DELETE FROM rating_checkpoint')
+    conn.commit()
+    conn.close()
+    _run(incremental_db, early_replays + late_replays, 'glicko', incremental=True)
+
+    assert _dump(incremental_db) == _dump(full_db)
+
+
+def test_missing_ranks(tmp_path, write_replay):
+    replays = _write_replays(tmp_path, write_replay, range(30))
+
+    full_db = _create_db(str(tmp_path / 'full.sqlite3'))
+    _run(full_db, replays, 'elo', incremental=False)
+
+    # Players table of an older version
+    incremental_db = _create_db(str(tmp_path / 'incremental.sqlite3'))
+    _run(incremental_db, replays, 'elo', incremental=True)
+    conn = sqlite3.connect(incremental_db)
+    conn.execute('ALTER TABLE players DROP COLUMN prv_rank')
+    conn.execute('ALTER TABLE players DROP COLUMN rank')
+    conn.commit()
+    conn.close()
+    _run(incremental_db, replays, 'elo', incremental=True)
+
+    assert _dump(incremental_db) == _dump(full_db)
+
+
+def test_unreadable_replay(tmp_path, write_replay):
+    replays = _write_replays(tmp_path, write_replay, range(10))
+
+    full_db = _create_db(str(tmp_path / 'full.sqlite3'))
+    _run(full_db, replays, 'elo', incremental=False)
+
+    # Dangling link, such as a replay removed while the directory is walked
+    broken = tmp_path / 'broken.orarep'
+    broken.symlink_to(tmp_path / 'missing.orarep')
+    database = _create_db(str(tmp_path / 'db.sqlite3'))
+    _run(database, [str(tmp_path)], 'elo', incremental=False)
+    assert _dump(database) == _dump(full_db)
+
+
+def test_targets(tmp_path, write_replay, monkeypatch):
+    replays = _write_replays(tmp_path, write_replay, range(30))
+    bans_file = tmp_path / 'bans.list'
+    bans_file.write_text('1001 player1\n')
+
+    expected = {}
+    for ranking in ('elo', 'glicko'):
+        database = _create_db(str(tmp_path / f'single-{ranking}.sqlite3'))
+        _run(database, replays, ranking, incremental=False)
+        expected[ranking] = _dump(database)
+
+    nb_parsed = []
+    get_results = replay.get_results
+    monkeypatch.setattr(replay, 'get_results', lambda filenames, jobs: nb_parsed.append(len(filenames)) or get_results(filenames, jobs))
+
+    # Separate directory so that the replays cache is not shared
+    multi_path = tmp_path / 'multi'
+    multi_path.mkdir()
+    specs = [
+        _create_db(str(multi_path / 'default.sqlite3')),
+        _create_db(str(multi_path / 'elo.sqlite3')) + ',ranking=elo',
+        _create_db(str(multi_path / 'glicko.sqlite3')) + f',ranking=glicko,bans-file={bans_file}',
+    ]
+    targets = [ladder._parse_target(spec) for spec in specs]
+    _run(None, replays, 'elo', incremental=False, targets=targets)
+    assert nb_parsed == [30]
+
+    assert _dump(str(multi_path / 'default.sqlite3')) == expected['elo']
+    assert _dump(str(multi_path / 'elo.sqlite3')) == expected['elo']
+    players, outcomes = _dump(str(multi_path / 'glicko.sqlite3'))
+    assert outcomes == expected['glicko'][1]
+    assert [p[3] for p in players] == [p[0] == 1001 for p in expected['glicko'][0]]
+
+
+def test_multiple_rankings(tmp_path, write_replay):
+    early_replays = _write_replays(tmp_path, write_replay, range(20))
+    late_replays = _write_replays(tmp_path, write_replay, range(15, 30, 2))
+    rankings = ('trueskill', 'elo', 'glicko')
+
+    single = {}
+    for ranking in rankings:
+        database = _create_db(str(tmp_path / f'single-{ranking}.sqlite3'))
+        _run(database, early_replays + late_replays, ranking, incremental=False)
+        single[ranking] = _dump(database)
+
+    database = _create_db(str(tmp_path / 'multi.sqlite3'))
+    _run(database, early_replays, '+'.join(rankings), incremental=True)
+    _run(database, early_replays + late_replays, '+'.join(rankings), incremental=True)
+    players, outcomes = _dump(database)
+
+    # The main ranking uses the regular columns, the others are appended
+    assert [p[:10] for p in players] == single['trueskill'][0]
+    assert [o[:16] for o in outcomes] == single['trueskill'][1]
+    for i, ranking in enumerate(rankings[1:]):
+        single_players, single_outcomes = single[ranking]
+        assert [p[10 + i * 2:12 + i * 2] for p in players] == [p[6:8] for p in single_players]
+        assert [o[16 + i * 4:20 + i * 4] for o in outcomes] == [o[6:10] for o in single_outcomes]
+
+    conn = sqlite3.connect(database)
+    assert conn.execute("SELECT value FROM ladder_info WHERE key='ranking'").fetchone() == ('trueskill+elo+glicko',)
+    assert sorted(r for r, in conn.execute('SELECT ranking FROM rating_checkpoint')) == sorted(rankings)
+    conn.close()
+
+
+@pytest.mark.parametrize('spec', ['', 'db,period=3m', 'db,ranking=foo', 'db,ranking=elo+foo', 'db,ranking=elo+elo',
+                                  'db,foo=bar', 'db,period'])
+def test_invalid_target(spec):
+    with pytest.raises(ArgumentTypeError):
+        ladder._parse_target(spec)
+
+
+def test_period_prefilter(tmp_path, write_replay, monkeypatch):
+    # Well inside the current period, whatever the current day and timezone
+    period_start = datetime.combine(get_period_start('2m'), datetime.min.time())
+    recent_time = period_start + timedelta(days=1, hours=12)
+    old_time = period_start - timedelta(days=400)
+    recent = write_replay(str(tmp_path / 'recent.orarep'), recent_time, *_players[:2])
+    old = write_replay(str(tmp_path / 'old.orarep'), old_time, *_players[2:4])
+    for filename, mtime in ((recent, recent_time), (old, old_time)):
+        os.utime(filename, (mtime.timestamp(), mtime.timestamp()))
+    missing = str(tmp_path / 'missing.orarep')
+
+    parsed = []
+    get_results = replay.get_results
+    monkeypatch.setattr(replay, 'get_results', lambda filenames, jobs: parsed.extend(filenames) or get_results(filenames, jobs))
+
+    database = _create_db(str(tmp_path / 'db.sqlite3'))
+    _run(database, [recent, old], 'elo', incremental=False, period='2m')
+    assert parsed == [recent]
+    players, outcomes = _dump(database)
+    assert [o[3] for o in outcomes] == [recent]
+
+    # An inaccessible replay is kept to be reported as a parsing error
+    assert filter_period_files([recent, old, missing], '2m') == [recent, missing]
+
+
+def test_global_stats(tmp_path, write_replay):
+    replays = _write_replays(tmp_path, write_replay, range(0, 30, 3))
+    database = _create_db(str(tmp_path / 'db.sqlite3'))
+    _run(database, replays, 'elo', incremental=False)
+
+    conn = sqlite3.connect(database)
+    nb_games, nb_players, avg_duration = conn.execute('SELECT * FROM stats_summary').fetchone()
+    assert nb_games == 10
+    assert nb_players == conn.execute('SELECT COUNT(*) FROM players').fetchone()[0]
+    assert avg_duration is not None
+
+    # Both sides of every game are counted
+    assert sum(n for n, in conn.execute('SELECT count FROM stats_factions')) == 2 * nb_games
+    assert sum(n for n, in conn.execute('SELECT count FROM stats_maps')) == nb_games
+
+    # One row per day, including the days without games, up to today
+    activity = conn.execute('SELECT date, count FROM stats_daily_activity ORDER BY date').fetchall()
+    assert activity[0] == ('2021-03-01', 1)
+    assert activity[1] == ('2021-03-02', 0)
+    assert activity[-1][0] == date.today().isoformat()
+    assert len(activity) == (datetime.fromisoformat(activity[-1][0]) - datetime(2021, 3, 1)).days + 1
+    assert sum(n for _, n in activity) == nb_games
+
+    # Every player has a profile, but not enough games for a rating series
+    assert conn.execute('SELECT COUNT(*) FROM player_stats').fetchone()[0] == nb_players
+    assert conn.execute('SELECT COUNT(*) FROM player_rating_series').fetchone()[0] == 0
+    conn.close()
+
+
+def test_stats_unchanged(tmp_path, write_replay, monkeypatch):
+    replays = _write_replays(tmp_path, write_replay, range(10))
+    database = _create_db(str(tmp_path / 'db.sqlite3'))
+    _run(database, replays, 'elo', incremental=True)
+    expected = _dump_stats(database)
+
+    # The outcomes are not aggregated again without new ones, but the
+    # banned players are not counted anymore
+    executed = []
+    monkeypatch.setattr(ladder, '_Ladder', _tracing_ladder(executed))
+    bans_file = tmp_path / 'bans.list'
+    bans_file.write_text('1001 player1\n')
+    _run(database, replays, 'elo', incremental=True, bans_file=str(bans_file))
+    assert not any('FROM outcomes' in sql for sql in executed)
+
+    stats = _dump_stats(database)
+    (nb_games, nb_players, avg_duration), = expected.pop('stats_summary')
+    assert stats.pop('stats_summary') == [(nb_games, nb_players - 1, avg_duration)]
+    assert stats == expected
+
+
+def test_player_stats_update(tmp_path, write_replay, monkeypatch):
+    replays = _write_replays(tmp_path, write_replay, range(40))
+    late_replays = _write_replays(tmp_path, write_replay, range(40, 42))
+
+    full_db = _create_db(str(tmp_path / 'full.sqlite3'))
+    _run(full_db, replays + late_replays, 'elo', incremental=False)
+
+    database = _create_db(str(tmp_path / 'db.sqlite3'))
+    _run(database, replays, 'elo', incremental=True)
+    executed = []
+    monkeypatch.setattr(ladder, '_Ladder', _tracing_ladder(executed))
+    _run(database, replays + late_replays, 'elo', incremental=True)
+    assert _dump_stats(database) == _dump_stats(full_db)
+
+    assert _dump_stats(database)['player_rating_series']
+
+    # Only the outcomes of the players of the new games are aggregated again
+    series = [sql for sql in executed if 'SELECT profile_id, rating FROM' in sql]
+    assert len(series) == 1
+    assert 'profile_id0 IN' in series[0] and 'profile_id1 IN' in series[0]
+
+
+def test_ranks():
+    ranking = ranking_systems['elo']()
+    players = []
+    for i, (prv_rating, rating, banned) in enumerate([
+            (1000, 1050, False),
+            (1020, 1050, False),
+            (1030, 1040, False),
+            (1100, 1200, True),
+            (1000, 990, False),
+    ]):
+        player = ladder._Player([ranking], i, f'player{i}', '', banned)
+        player.prv_rating = ranking.rating_from_state([prv_rating])
+        player.rating = ranking.rating_from_state([rating])
+        players.append(player)
+    ladder._set_ranks(players)
+
+    # The ties share a rank, the next rating gets the following one, and
+    # the banned players are not ranked
+    assert [p.rank for p in players] == [1, 1, 2, None, 3]
+    assert [p.prv_rank for p in players] == [3, 2, 1, None, 3]
@@ -0,0 +1,68 @@
+from . import miniyaml
+
+
+def test_load():
+    data = b'''Root:
+\tMod: ra
+\tEmptyValue:
+\tMapTitle: Some map: with colon  
+\tNested:
+\t\tA: 1
+\t\tB:
+\t\tC:  spaces
+\tAfter: 2
+Player@0:
+\tName: Foo
+NoColon
+: no key
+Empty:
+'''
+    assert miniyaml.load(data) == {
+        'Root': {
+            'Mod': 'ra',
+            'EmptyValue': '',
+            'MapTitle': 'Some map: with colon  ',
+            'Nested': {'A': '1', 'B': '', 'C': 'spaces'},
+            'After': '2',
+        },
+        'Player@0': {'Name': 'Foo'},
+        'Empty': '',
+    }
+
+
+def test_load_edge_cases():
+    assert miniyaml.load(b'') == ''
+    assert miniyaml.load(memoryview(b'A: 1\r\nB: 2')) == {'A': '1', 'B': '2'}
+    # A node overridden by a value keeps the value
+    assert miniyaml.load(b'A:\nA: x\n\tB: 1\n') == {'A': 'x'}
+    # A value line doesn't close the deeper nodes
+    assert miniyaml.load(b'A:\n\tB:\n\t\tC: 1\n\tD: 2\n\t\tE: 3\n') == {'A': {'B': {'C': '1', 'E': '3'}, 'D': '2'}}
+
+
+def _flatten(d, prefix=''):
+    for key, value in d.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f'{prefix}{key}.')
+        else:
+            yield f'{prefix}{key}', value
+
+
+def test_extract():
+    data = b'''Root:
+\tMod: ra
+\tNested:
+\t\tA: 1
+\t\tB:
+\tMapUid: abc
+Player@0:
+\tName: Foo
+\tSub:
+\t\tName: Bar
+Player@1:
+\tName: Baz
+'''
+    values = dict(_flatten(miniyaml.load(data)))
+    assert miniyaml.extract(data, values.keys()) == values
+
+    paths = ['Root.MapUid', 'Player@0.Name', 'Player@1', 'Player@2', 'Player@1.Handicap']
+    assert miniyaml.extract(data, paths) == {'Root.MapUid': 'abc', 'Player@0.Name': 'Foo', 'Player@1': ''}
@@ -0,0 +1,126 @@
+import json
+import random
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import pytest
+
+from . import ranking as ranking_registry
+from .ladder import SameIdLookup
+from .ranking import ranking_systems
+from .rankings.abc import RankingBase
+
+
+_Game = namedtuple('_Game', 'player0 player1 end_time')
+
+# Very conservative, the point is to catch a pathologically slow system
+_min_games_per_sec = 500
+
+
+def _get_games(nb_games, nb_players, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2021, 3, 1)
+    games = []
+    for i in range(nb_games):
+        w, l = rng.sample(range(nb_players), 2)
+        games.append(_Game(w, l, start + timedelta(hours=i * 5)))
+    return games
+
+
+def _states(ratings):
+    return [(r0.state, r1.state) for r0, r1 in ratings]
+
+
+@pytest.fixture(params=sorted(ranking_systems))
+def ranking(request):
+    return ranking_systems[request.param]()
+
+
+def test_registry():
+    assert {'trueskill', 'trueskill1v1', 'elo', 'glicko'} <= set(ranking_systems)
+    assert 'foo' not in ranking_systems
+    with pytest.raises(KeyError):
+        ranking_systems['foo']
+
+
+def test_registry_entry_points(monkeypatch):
+    group = ranking_registry._entry_point_group
+    plugins = [
+        ranking_registry.EntryPoint('elo2', 'laddertools.rankings.elo:RankingELO', group),
+        # The builtin systems can not be overridden
+        ranking_registry.EntryPoint('elo', 'laddertools.rankings.glicko:RankingGlicko', group),
+        # Not usable in a column name
+        ranking_registry.EntryPoint('elo-3', 'laddertools.rankings.elo:RankingELO', group),
+        ranking_registry.EntryPoint('elo 4', 'laddertools.rankings.elo:RankingELO', group),
+    ]
+    monkeypatch.setattr(ranking_registry, '_get_entry_points', lambda: plugins)
+    systems = ranking_registry._RankingSystems()
+    assert set(systems) == set(ranking_systems) | {'elo2'}
+    assert systems['elo2'] is systems['elo'] is ranking_systems['elo']
+
+
+def test_registry_lazy_import():
+    # Selecting a system must not import the other ones
+    code = (
+        'import sys\n'
+        'from laddertools import ladder\n'
+        'ladder.ranking_systems["elo"]\n'
+        'assert "trueskill" not in sys.modules, "trueskill imported"\n'
+        'assert "laddertools.rankings.glicko" not in sys.modules, "glicko imported"\n'
+    )
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+def test_conformance_interface(ranking):
+    assert isinstance(ranking, RankingBase)
+    rating = ranking.get_default_rating()
+    assert isinstance(rating.display_value, int)
+    assert ranking.rating_from_state(json.loads(json.dumps(rating.state))).state == rating.state
+
+
+def test_conformance_game(ranking):
+    default = ranking.get_default_rating()
+    winner, loser = ranking.record_result(ranking.get_default_rating(), ranking.get_default_rating())
+    assert winner.value > default.value > loser.value
+    assert winner.display_value >= default.display_value >= loser.display_value
+
+
+def test_conformance_win_probability(ranking):
+    default = ranking.get_default_rating()
+    assert ranking.win_probability(default, ranking.get_default_rating()) == pytest.approx(0.5)
+    winner, loser = ranking.record_result(ranking.get_default_rating(), ranking.get_default_rating())
+    p = ranking.win_probability(winner, loser)
+    assert 0.5 < p < 1
+    assert ranking.win_probability(loser, winner) == pytest.approx(1 - p)
+
+
+def test_conformance_series(ranking):
+    games = _get_games(300, 20)
+    ratings = ranking.compute_ratings_from_series_of_games(games, SameIdLookup())
+    assert len(ratings) == len(games)
+
+    # Same ratings when the series is resumed from a serialized state
+    state = ranking.create_state()
+    first = ranking.compute_ratings_from_series_of_games(games[:120], SameIdLookup(), state)
+    assert state.end_time == games[119].end_time
+    state = ranking.load_state(json.loads(json.dumps(state.to_json())))
+    second = ranking.compute_ratings_from_series_of_games(games[120:], SameIdLookup(), state)
+    assert _states(first + second) == pytest.approx(_states(ratings), rel=1e-9)
+    assert state.end_time == games[-1].end_time
+
+    # The state holds the last ratings of the players
+    for game, (r0, r1) in zip(games, ratings):
+        last = {game.player0: r0, game.player1: r1}
+    for player, rating in last.items():
+        assert state.get_rating(player).state == pytest.approx(rating.state, rel=1e-9)
+
+
+def test_throughput(ranking):
+    games = _get_games(5000, 200)
+    t = time.perf_counter()
+    ranking.compute_ratings_from_series_of_games(games, SameIdLookup())
+    games_per_sec = len(games) / (time.perf_counter() - t)
+    assert games_per_sec > _min_games_per_sec
@@ -0,0 +1,58 @@
+from argparse import ArgumentTypeError
+from datetime import datetime, timedelta
+
+import pytest
+
+from .replay import get_results, positive_int
+
+
+def test_parallel_results(tmp_path, write_replay):
+    filenames = []
+    for i in range(20):
+        loser = ('B', 'fpB') if i % 3 else ('A', 'fpA')  # same player: error
+        filename = str(tmp_path / f'{i:02d}.orarep')
+        filenames.append(write_replay(filename, datetime(2021, 3, 1) + timedelta(hours=i), ('A', 'fpA'), loser))
+
+    serial = [(r and str(r), e) for r, e in get_results(filenames, jobs=1)]
+    parallel = [(r and str(r), e) for r, e in get_results(filenames, jobs=3)]
+    assert parallel == serial
+    assert [e is not None for r, e in serial] == [i % 3 == 0 for i in range(20)]
+
+
+def test_invalid_replays(tmp_path, write_replay):
+    filename = write_replay(str(tmp_path / 'a.orarep'), datetime(2021, 3, 1), ('A', 'fpA'), ('B', 'fpB'))
+    with open(filename, 'rb') as f:
+        data = f.read()
+
+    invalid_files = dict(
+        empty=b'',
+        small=data[-12:],
+        truncated=data[-100:],
+        no_marker=data[:-4],
+    )
+    filenames = []
+    for name, content in invalid_files.items():
+        filenames.append(str(tmp_path / f'{name}.orarep'))
+        with open(filenames[-1], 'wb') as f:
+            f.write(content)
+
+    for result, error in get_results(filenames):
+        assert result is None and error
+
+
+def test_players_count(tmp_path, write_replay):
+    players = [('A', 'fpA'), ('B', 'fpB'), ('C', 'fpC')]
+    filenames = [
+        write_replay(str(tmp_path / 'two.orarep'), datetime(2021, 3, 1), *players[:2]),
+        write_replay(str(tmp_path / 'three.orarep'), datetime(2021, 3, 1), *players[:2], extra_players=players[2:]),
+    ]
+    (two, error), (three, three_error) = get_results(filenames)
+    assert two is not None and error is None
+    assert three is None and three_error == "game doesn't have 2 players"
+
+
+def test_positive_int():
+    assert positive_int('4') == 4
+    for value in ('0', '-1', 'x'):
+        with pytest.raises(ArgumentTypeError):
+            positive_int(value)
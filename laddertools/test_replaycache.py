@@ -0,0 +1,90 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from . import replay
+from .replay import get_result
+from .replaycache import ReplayCache, CachedReplayError
+from .utils import parse_results
+
+
+def _player_tuple(player):
+    return tuple(getattr(player, attr) for attr in player.__slots__)
+
+
+def _result_tuple(result):
+    return (
+        result.start_time, result.end_time, result.filename,
+        _player_tuple(result.player0), _player_tuple(result.player1),
+        result.map_uid, result.map_title,
+    )
+
+
+def test_replay_cache(tmp_path, write_replay, monkeypatch):
+    filename = write_replay(str(tmp_path / 'a.orarep'), datetime(2021, 3, 1), ('A', 'fpA'), ('B', 'fpB'))
+    expected = _result_tuple(get_result(filename))
+
+    cache_path = str(tmp_path / 'cache.sqlite3')
+    with ReplayCache(cache_path) as cache:
+        assert _result_tuple(cache.get_result(filename)) == expected
+
+    # The replay must not be parsed again
+    monkeypatch.setattr('laddertools.replay.get_result', None)
+    with ReplayCache(cache_path) as cache:
+        assert _result_tuple(cache.get_result(filename)) == expected
+
+
+def test_replay_cache_error(tmp_path, write_replay):
+    filename = write_replay(str(tmp_path / 'a.orarep'), datetime(2021, 3, 1), ('A', 'fpA'), ('B', 'fpA'))
+
+    cache_path = str(tmp_path / 'cache.sqlite3')
+    with ReplayCache(cache_path) as cache:
+        with pytest.raises(Exception, match='are the same player'):
+            cache.get_result(filename)
+    with ReplayCache(cache_path) as cache:
+        with pytest.raises(CachedReplayError, match='are the same player'):
+            cache.get_result(filename)
+
+    # A modified replay is parsed again
+    write_replay(filename, datetime(2021, 3, 1), ('A', 'fpA'), ('B', 'fpB'))
+    os.utime(filename, ns=(0, 0))
+    with ReplayCache(cache_path) as cache:
+        assert cache.get_result(filename).player1.fingerprint == 'fpB'
+
+
+def test_replay_cache_missing(tmp_path, write_replay, caplog):
+    filename = str(tmp_path / 'a.orarep')
+    cache_path = str(tmp_path / 'cache.sqlite3')
+    with ReplayCache(cache_path) as cache:
+        assert cache.get(filename) is None
+        cache.add(filename, error='gone')
+        assert parse_results([filename], cache) == []
+    assert 'a.orarep' in caplog.text
+
+    # Nothing was recorded about the missing replay
+    write_replay(filename, datetime(2021, 3, 1), ('A', 'fpA'), ('B', 'fpB'))
+    with ReplayCache(cache_path) as cache:
+        assert cache.get(filename) is None
+        assert cache.get_result(filename).player1.fingerprint == 'fpB'
+
+
+def test_replay_cache_read_error(tmp_path, write_replay, monkeypatch):
+    filename = write_replay(str(tmp_path / 'a.orarep'), datetime(2021, 3, 1), ('A', 'fpA'), ('B', 'fpB'))
+    cache_path = str(tmp_path / 'cache.sqlite3')
+
+    def get_result(filename):
+        raise PermissionError(13, 'Permission denied', filename)
+
+    get_valid_result = replay.get_result
+    monkeypatch.setattr(replay, 'get_result', get_result)
+    with ReplayCache(cache_path) as cache:
+        with pytest.raises(PermissionError):
+            cache.get_result(filename)
+        assert parse_results([filename], cache) == []
+
+    # The replay is read again once the error is gone
+    monkeypatch.setattr(replay, 'get_result', get_valid_result)
+    with ReplayCache(cache_path) as cache:
+        assert cache.get(filename) is None
+        assert parse_results([filename], cache)[0].player1.fingerprint == 'fpB'
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from .rankings.trueskill import RankingTrueskill
+from .rankings.trueskill1v1 import RankingTrueskill1v1, _v_w
+
+
+def test_trueskill1v1_default_rating():
+    ref = RankingTrueskill.get_default_rating()
+    rating = RankingTrueskill1v1.get_default_rating()
+    assert rating.state == ref.state
+    assert rating.display_value == ref.display_value
+
+
+@pytest.mark.parametrize('mu0, sigma0, mu1, sigma1', [
+    (25, 25 / 3, 25, 25 / 3),
+    (30, 2, 20, 2),
+    (20, 2, 30, 2),     # upset
+    (10, 1, 50, 1),     # very unlikely upset
+    (50, 0.5, 10, 8),
+])
+def test_trueskill1v1_game(mu0, sigma0, mu1, sigma1):
+    ref = RankingTrueskill()
+    ranking = RankingTrueskill1v1()
+    expected = ref.record_result(ref.rating_from_state([mu0, sigma0]), ref.rating_from_state([mu1, sigma1]))
+    ratings = ranking.record_result(ranking.rating_from_state([mu0, sigma0]), ranking.rating_from_state([mu1, sigma1]))
+    for rating, e in zip(ratings, expected):
+        assert rating.state == pytest.approx(e.state, rel=1e-5, abs=1e-5)
+
+
+@pytest.mark.parametrize('t', [-8, -10, -20, -36])
+def test_trueskill1v1_lower_tail(t):
+    # The pdf/cdf ratio follows -t - 1/t in the lower tail, where the
+    # corrections used to fall back on their asymptotic values too early
+    v, w = _v_w(t)
+    assert v == pytest.approx(-t - 1 / t, rel=1e-3)
+    assert 0 < w < 1
+
+
+def test_trueskill1v1_series():
+    rng = random.Random(0)
+    ref = RankingTrueskill()
+    ranking = RankingTrueskill1v1()
+    expected = [ref.get_default_rating() for _ in range(30)]
+    ratings = [ranking.get_default_rating() for _ in range(30)]
+    for _ in range(5000):
+        w, l = rng.sample(range(30), 2)
+        if rng.random() < 0.3:
+            w, l = min(w, l), max(w, l)
+        expected[w], expected[l] = ref.record_result(expected[w], expected[l])
+        ratings[w], ratings[l] = ranking.record_result(ratings[w], ratings[l])
+    for rating, e in zip(ratings, expected):
+        assert rating.state == pytest.approx(e.state, rel=1e-5)
+        assert abs(rating.display_value - e.display_value) <= 1
@@ -19,102 +19,156 @@ import re
 import os
 import os.path as op
 import logging
-from datetime import date
-from urllib.request import urlopen
-
-from . import miniyaml, replay
-
-
-def _update_account_cache(accounts_db, player):
-    '''
-    Query OpenRA account service to get information on the player
-    '''
-
-    fingerprint = player.fingerprint
-
-    if fingerprint in accounts_db:  # already in cache
-        return accounts_db[fingerprint] is not None
+from datetime import date, datetime, timedelta
+
+from . import replay
+from .accounts import AccountResolver
+from .replaycache import CachedReplayError
+
+
+def _get_replay_results(filenames, cache, jobs):
+    """Yields a (filename, result, error) tuple for every replay that needs
+    to be considered, in the same order as `filenames`."""
+
+    cached = {}
+    pending = []
+    for filename in filenames:
+        try:
+            result = None if cache is None else cache.get(filename)
+        except CachedReplayError as e:
+            # Already reported when the replay was parsed for the first time
+            logging.debug(f'{op.basename(filename)}: {e}')
+            continue
+        if result is None:
+            pending.append(filename)
+        else:
+            cached[filename] = result
 
-    logging.info(f'Querying {player.display_name} with fingerprint {fingerprint}...')
-    player_url = f'https://forum.openra.net/openra/info/{fingerprint}'
+    parsed = dict(zip(pending, replay.get_results(pending, jobs)))
 
-    try:
-        player_yaml = urlopen(player_url).read()
-    except Exception:
-        logging.error(f'Failed to fetch player info with {fingerprint=}')
-        accounts_db[fingerprint] = None
-        return False
-
-    if not player_yaml:
-        logging.error('Player info is empty')
-        accounts_db[fingerprint] = None
-        return False
-
-    player_info = miniyaml.load(player_yaml)
-    if 'Error' in player_info:
-        logging.error(player_info['Error'])
-        accounts_db[fingerprint] = None
-        return False
-
-    profile_fp = player_info['Player']['Fingerprint']
-    if profile_fp != fingerprint:
-        logging.error(f"Player fingerprint doesn't match: {profile_fp} != {fingerprint}")
-        accounts_db[fingerprint] = None
-        return False
-
-    profile_id = int(player_info['Player']['ProfileID'])
-    profile_name = player_info['Player']['ProfileName']
-    avatar = player_info['Player']['Avatar']
-    avatar_url = avatar['Src'] if avatar else ''
-    accounts_db[fingerprint] = (profile_id, profile_name, avatar_url)
-
-    logging.info(f'{fingerprint}: {profile_name=} {profile_id=}')
-    return True
-
-
-def _parse_replay(results, accounts_db, filename):
-    if not filename.endswith('.orarep'):
-        return
-    try:
-        result = replay.get_result(filename)
-    except Exception as e:
-        logging.error(f'{op.basename(filename)}: {e}')
-        return
-    if _update_account_cache(accounts_db, result.player0) and \
-       _update_account_cache(accounts_db, result.player1):
-        results.append(result)
-        logging.info(f'{op.basename(filename)}: recorded')
+    for filename in filenames:
+        if filename in cached:
+            yield filename, cached[filename], None
+        elif filename in parsed:
+            result, error = parsed[filename]
+            if cache is not None:
+                cache.add(filename, result, error)
+            yield filename, result, error
 
 
-def _filter_period(results, period):
+def get_period_start(period):
     if period is None:
-        return results
+        return None
 
     today = date.today()
     if period == '1m':
-        start = date(today.year, today.month, 1)
-        return [r for r in results if r.end_time.date() >= start]
+        return date(today.year, today.month, 1)
     elif period == '2m':
         start_month = ((today.month - 1) & ~1) + 1
-        start = date(today.year, start_month, 1)
-        return [r for r in results if r.end_time.date() >= start]
+        return date(today.year, start_month, 1)
 
     assert False
 
 
-def get_results(accounts_db, replays, period=None):
-    results = []
+def get_period_mtime_ns(period):
+    """Returns the minimum modification time (in ns) of a replay containing a
+    game of the period, or None if there is no period.
+
+    A replay is written at the end of the game so its modification time can
+    not be earlier than the end of the game. A margin of one day is taken
+    since the period starts on a local date while the games time is UTC.
+    """
+    start = get_period_start(period)
+    if start is None:
+        return None
+    start = datetime.combine(start - timedelta(days=1), datetime.min.time())
+    return int(start.timestamp()) * 10**9
+
+
+def _get_mtime_ns(filename, default):
+    try:
+        return os.stat(filename).st_mtime_ns
+    except OSError:
+        return default
+
+
+def filter_period_files(filenames, period):
+    """Cheaply discards the replays that can not contain a game of the
+    period, before they're parsed. The replays which can not be accessed are
+    kept so that the error is reported when they're parsed."""
+    min_mtime_ns = get_period_mtime_ns(period)
+    if min_mtime_ns is None:
+        return filenames
+    return [fn for fn in filenames if _get_mtime_ns(fn, min_mtime_ns) >= min_mtime_ns]
+
+
+def _filter_period(results, period):
+    start = get_period_start(period)
+    if start is None:
+        return results
+    return [r for r in results if r.end_time.date() >= start]
+
+
+def get_replay_files(replays):
     for filename in replays:
         if op.isdir(filename):
             for root, dirs, files in os.walk(filename):
                 for name in files:
-                    _parse_replay(results, accounts_db, op.join(root, name))
+                    yield op.join(root, name)
         else:
-            _parse_replay(results, accounts_db, filename)
+            yield filename
+
+
+def parse_results(replays, cache=None, jobs=1, period=None):
+    """Parses all the replays (possibly in parallel), logging the errors. If
+    a period is specified, the replays which obviously aren't part of it
+    are skipped."""
+
+    filenames = [fn for fn in get_replay_files(replays) if fn.endswith('.orarep')]
+    filenames = filter_period_files(filenames, period)
+    parsed = []
+    nb_errors = 0
+    for filename, result, error in _get_replay_results(filenames, cache, jobs):
+        if error is not None:
+            logging.error(f'{op.basename(filename)}: {error}')
+            nb_errors += 1
+            continue
+        parsed.append(result)
+    if nb_errors:
+        logging.warning(f'{nb_errors}/{len(filenames)} replays could not be parsed')
+    return parsed
+
+
+def resolve_accounts(accounts_db, parsed, resolver=None, account_failures=None):
+    """Queries all the unknown accounts of the players at once."""
+
+    if resolver is None:
+        resolver = AccountResolver()
+    fingerprints = [fp for r in parsed for fp in (r.player0.fingerprint, r.player1.fingerprint)]
+    resolver.resolve(accounts_db, fingerprints, account_failures)
+
+
+def select_results(accounts_db, parsed, period=None):
+    """Keeps the results of the identified players within the period, in
+    chronological order."""
+
+    results = []
+    for result in parsed:
+        if accounts_db[result.player0.fingerprint] is not None and \
+           accounts_db[result.player1.fingerprint] is not None:
+            results.append(result)
+            logging.info(f'{op.basename(result.filename)}: recorded')
+
     results = _filter_period(results, period)
     return sorted(results, key=lambda r: r.end_time)
 
 
+def get_results(accounts_db, replays, period=None, cache=None, jobs=1, resolver=None, account_failures=None):
+    parsed = parse_results(replays, cache, jobs, period)
+    resolve_accounts(accounts_db, parsed, resolver, account_failures)
+    return select_results(accounts_db, parsed, period)
+
+
 _banned_profile_re = re.compile(r'^\d+')
 
 
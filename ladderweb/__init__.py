@@ -20,7 +20,6 @@ import colorsys
 import os
 import os.path as op
 import json
-import numpy as np
 import sqlite3
 import calendar
 from datetime import date, timedelta
@@ -38,13 +37,6 @@ from flask import (
 from .mods import mods
 
 
-# XXX: store in a file probably
-_cfg = dict(
-    min_datapoints=10,
-    datapoints=50,
-)
-
-
 _allowed_mods = list(mods.keys())
 _allowed_periods = ('2m', '1m', 'all')
 
@@ -193,17 +185,22 @@ def leaderboard_js():
             wins,
             losses,
             prv_rating,
-            rating
+            rating,
+            prv_rank,
+            rank
         FROM players
         WHERE rating > 0 AND NOT banned
-        ORDER BY rating DESC
+        ORDER BY rating DESC, profile_name
         '''
     )
 
     rows = []
-    for i, (profile_id, profile_name, avatar_url, wins, losses, prv_rating, rating) in enumerate(cur, 1):
+    for profile_id, profile_name, avatar_url, wins, losses, prv_rating, rating, prv_rank, rank in cur:
         rows.append(dict(
-            row_id=i,
+            rank=dict(
+                value=rank,
+                diff=prv_rank - rank,
+            ),
             player=dict(
                 name=escape(profile_name),
                 url=url_for('player', profile_id=profile_id) + _args_url(),
@@ -236,32 +233,161 @@ def _stripped_map_name(map_name):
     return _tag_regex.sub('', map_name).strip()
 
 
+# Maximum number of games of a page of the DataTables
+_max_page_length = 100
+
+_games_columns = '''
+    o.hash AS hash,
+    o.end_time AS end_time,
+    strftime('%M:%S', julianday(o.end_time) - julianday(o.start_time)) AS duration,
+    o.profile_id0 AS profile_id0,
+    o.profile_id1 AS profile_id1,
+    o.rating_0 - o.rating_0_prv AS diff0,
+    o.rating_1 - o.rating_1_prv AS diff1,
+    p0.profile_name AS p0_name,
+    p1.profile_name AS p1_name,
+    p0.banned AS p0_banned,
+    p1.banned AS p1_banned,
+    o.map_title AS map_title
+'''
+
+_games_joins = '''
+    LEFT JOIN players p0 ON p0.profile_id = o.profile_id0
+    LEFT JOIN players p1 ON p1.profile_id = o.profile_id1
+'''
+
+
+def _get_page_key(name):
+    end_time = request.args.get(f'{name}_end_time')
+    game_hash = request.args.get(f'{name}_hash')
+    return (end_time, game_hash) if end_time and game_hash else None
+
+
+def _get_datatables_params():
+    """Parses the parameters of the DataTables server-side processing
+    protocol. Only the games can be ordered, by date (the first column).
+
+    The (end_time, hash) key of the last (`after_*`) or first (`before_*`)
+    game of the current page is sent along when moving to the next or
+    previous page (see `games_page_data()` in dtfuncs.js).
+    """
+    length = request.args.get('length', 10, type=int)
+    if length < 0 or length > _max_page_length:
+        length = _max_page_length
+    search = request.args.get('search[value]', '').strip()
+    return dict(
+        draw=request.args.get('draw', 0, type=int),
+        start=max(request.args.get('start', 0, type=int), 0),
+        length=length,
+        search=search,
+        descending=request.args.get('order[0][dir]', 'desc') != 'asc',
+        after=_get_page_key('after'),
+        before=_get_page_key('before'),
+    )
+
+
+def _like_pattern(search):
+    escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+# Outcomes of the games of a player; the union is used instead of a
+# `:pid IN (profile_id0, profile_id1)` condition so that both sides are
+# searched with their index
+_player_outcomes = '''(
+    SELECT * FROM outcomes WHERE profile_id0 = :pid
+    UNION ALL
+    SELECT * FROM outcomes WHERE profile_id1 = :pid
+)'''
+
+
+def _get_games_page(db, dt_params, outcomes='outcomes', params=None):
+    """Returns the DataTables response data (without the rows) and the
+    outcomes of the requested page of games among `outcomes` (a table or a
+    subquery).
+
+    The pages are read with keyset pagination on (end_time, hash): the next
+    and previous pages are read from the key of the last and first game of
+    the current page sent by the client, so they cost the same whatever
+    their position. The other pages are only known by their offset: their
+    first key is then looked up with an OFFSET on the outcomes index alone
+    (without joining the players unless searching), which is still
+    O(start).
+    """
+
+    params = dict(params or {})
+    where = '1'
+    if dt_params['search']:
+        where = '''(
+            p0.profile_name LIKE :search ESCAPE '\\' OR
+            p1.profile_name LIKE :search ESCAPE '\\' OR
+            o.map_title LIKE :search ESCAPE '\\'
+        )'''
+        params['search'] = _like_pattern(dt_params['search'])
+    joins = _games_joins if dt_params['search'] else ''
+
+    total, = db.execute(f'SELECT COUNT(*) FROM {outcomes} o', params).fetchone()
+    if dt_params['search']:
+        filtered, = db.execute(f'SELECT COUNT(*) FROM {outcomes} o {joins} WHERE {where}', params).fetchone()
+    else:
+        filtered = total
+    response = dict(draw=dt_params['draw'], recordsTotal=total, recordsFiltered=filtered)
+    if not dt_params['length']:
+        return response, []
+
+    descending = dt_params['descending']
+    if dt_params['after']:
+        key, cmp = dt_params['after'], '<' if descending else '>'
+    elif dt_params['before']:
+        # Read backward from the first game of the current page
+        key, cmp = dt_params['before'], '>' if descending else '<'
+        descending = not descending
+    else:
+        key = db.execute(f'''
+            SELECT o.end_time, o.hash FROM {outcomes} o {joins}
+            WHERE {where}
+            ORDER BY o.end_time {'DESC' if descending else 'ASC'}, o.hash {'DESC' if descending else 'ASC'}
+            LIMIT 1 OFFSET :start''',
+            dict(params, start=dt_params['start'])
+        ).fetchone()
+        if key is None:
+            return response, []
+        cmp = '<=' if descending else '>='
+
+    where += f' AND (o.end_time, o.hash) {cmp} (:key_end_time, :key_hash)'
+    params.update(key_end_time=key[0], key_hash=key[1])
+    order = 'DESC' if descending else 'ASC'
+    cur = db.execute(f'''
+        SELECT {_games_columns}
+        FROM {outcomes} o {_games_joins}
+        WHERE {where}
+        ORDER BY o.end_time {order}, o.hash {order}
+        LIMIT :length''',
+        dict(params, length=dt_params['length'])
+    )
+    matches = cur.fetchall()
+    cur.close()
+    if dt_params['before'] and not dt_params['after']:
+        matches.reverse()
+
+    # Keys of the page, for the client to request the next or previous one
+    if matches:
+        response['page'] = dict(
+            start=dt_params['start'],
+            length=dt_params['length'],
+            search=dt_params['search'],
+            descending=dt_params['descending'],
+            first=[matches[0]['end_time'], matches[0]['hash']],
+            last=[matches[-1]['end_time'], matches[-1]['hash']],
+        )
+    return response, matches
+
+
 @app.route('/latest-js')
 def latest_games_js():
     _, cur_mod, _ = _get_request_params()
     db = _db_get()
-    cur = db.execute('''
-        SELECT
-            hash,
-            end_time,
-            strftime('%M:%S', julianday(end_time) - julianday(start_time)) AS duration,
-            profile_id0,
-            profile_id1,
-            rating_0 - rating_0_prv AS diff0,
-            rating_1 - rating_1_prv AS diff1,
-            p0.profile_name AS p0_name,
-            p1.profile_name AS p1_name,
-            p0.banned AS p0_banned,
-            p1.banned AS p1_banned,
-            map_title
-        FROM outcomes o
-        LEFT JOIN players p0 ON p0.profile_id = o.profile_id0
-        LEFT JOIN players p1 ON p1.profile_id = o.profile_id1
-        ORDER BY o.end_time DESC
-        '''
-    )
-    matches = cur.fetchall()
-    cur.close()
+    response, matches = _get_games_page(db, _get_datatables_params())
 
     games = []
     for match in matches:
@@ -287,72 +413,35 @@ def latest_games_js():
         )
         games.append(game)
 
-    return jsonify(games)
-
-
-def _scaled(a, m):
-    n = len(a)
-    nr = range(n)
-    mr = [x * n / m for x in range(m)]
-    return [round(x) for x in np.interp(mr, nr, a)]
+    response['data'] = games
+    return jsonify(response)
 
 
 def _get_player_ratings(db, profile_id):
-    cur = db.execute('''
-        SELECT
-            profile_id0,
-            profile_id1,
-            rating_0,
-            rating_1
-        FROM outcomes o
-        LEFT JOIN players p0 ON p0.profile_id = o.profile_id0
-        LEFT JOIN players p1 ON p1.profile_id = o.profile_id1
-        WHERE :pid IN (o.profile_id0, o.profile_id1)
-        ORDER BY o.end_time''',
+    cur = db.execute(
+        'SELECT rating FROM player_rating_series WHERE profile_id=:pid ORDER BY point',
         dict(pid=profile_id)
     )
-    ratings = []
-    for match in cur:
-        if match['profile_id0'] == profile_id:
-            rating = match['rating_0']
-        elif match['profile_id1'] == profile_id:
-            rating = match['rating_1']
-        else:
-            continue  # XXX shouldn't happen, assert?
-        ratings.append(rating)
+    ratings = [r['rating'] for r in cur]
     cur.close()
 
-    ratings = ratings[_cfg['min_datapoints']:]
     if not ratings:
         return [], []
 
-    datapoints = _cfg['datapoints']
-    rating_labels = [str('') for x in range(datapoints)]
-    rating_labels = json.dumps(rating_labels)
-
-    ratings = _scaled(ratings, datapoints)  # rescale all ratings to a fixed number of data points
-    rating_data = json.dumps(ratings)
-
+    rating_labels = [str('') for x in range(len(ratings))]
     return dict(
-        labels=rating_labels,
-        data=rating_data,
+        labels=json.dumps(rating_labels),
+        data=json.dumps(ratings),
     )
 
 
 def _get_player_info(db, profile_id):
     cur = db.execute('''
         SELECT
-        *, (
-            SELECT COUNT(*)
-            FROM players
-            WHERE rating >= (SELECT rating FROM players WHERE profile_id=:pid) AND NOT banned
-        ) AS rank,
-        (
-            SELECT strftime('%M:%S', AVG(julianday(end_time) - julianday(start_time)))
-            FROM outcomes
-            WHERE :pid IN (profile_id0, profile_id1)
-        ) AS avg_game_duration
-        FROM players WHERE profile_id=:pid AND NOT banned
+        players.*, player_stats.avg_game_duration, player_stats.factions, player_stats.maps
+        FROM players
+        LEFT JOIN player_stats USING (profile_id)
+        WHERE profile_id=:pid AND NOT banned
         LIMIT 1''',
         dict(pid=profile_id)
     )
@@ -361,20 +450,10 @@ def _get_player_info(db, profile_id):
     return player
 
 
-def _get_player_faction_stats(db, profile_id):
-    cur = db.execute('''
-        SELECT COUNT(*)/2 AS count,
-            (CASE
-            WHEN o.profile_id0=:pid THEN selected_faction_0
-            WHEN o.profile_id1=:pid THEN selected_faction_1
-        END) AS faction
-        FROM outcomes o LEFT JOIN players p ON p.profile_id IN (o.profile_id0, o.profile_id1)
-        WHERE :pid IN (o.profile_id0, o.profile_id1)
-        GROUP BY faction''',
-        dict(pid=profile_id)
-    )
-    hist = [(r['faction'], r['count']) for r in cur]
-    cur.close()
+def _get_player_faction_stats(player):
+    hist = json.loads(player['factions'] or '[]')
+    if not hist:
+        return [], [], []
     faction_names, faction_data = zip(*hist)
     faction_colors = _get_colors(len(hist))
     return dict(
@@ -385,28 +464,12 @@ def _get_player_faction_stats(db, profile_id):
     )
 
 
-def _get_player_map_stats(db, profile_id):
-    cur = db.execute('''
-        SELECT COUNT(*) AS count, map_title FROM outcomes WHERE profile_id0=:pid GROUP BY map_title''',
-        dict(pid=profile_id)
-    )
-    hist_wins = {r['map_title']: r['count'] for r in cur}
-    cur.close()
-
-    cur = db.execute('''
-        SELECT -COUNT(*) AS count, map_title FROM outcomes WHERE profile_id1=:pid GROUP BY map_title''',
-        dict(pid=profile_id)
-    )
-    hist_losses = {r['map_title']: r['count'] for r in cur}
-    cur.close()
-
-    map_names = sorted(list(set(hist_wins.keys()) | set(hist_losses.keys())))
-    map_win_data = [hist_wins.get(m, 0) for m in map_names]
-    map_loss_data = [hist_losses.get(m, 0) for m in map_names]
+def _get_player_map_stats(player):
+    hist = sorted(json.loads(player['maps'] or '[]'))
     return dict(
-        names=map_names,
-        win_data=map_win_data,
-        loss_data=map_loss_data,
+        names=[map_title for map_title, _, _ in hist],
+        win_data=[wins for _, wins, _ in hist],
+        loss_data=[-losses for _, _, losses in hist],
     )
 
 
@@ -414,48 +477,31 @@ def _get_player_map_stats(db, profile_id):
 def player_games_js(profile_id):
     _, cur_mod, _ = _get_request_params()
     db = _db_get()
-    cur = db.execute('''
-        SELECT
-            hash,
-            end_time,
-            strftime('%M:%S', julianday(end_time) - julianday(start_time)) AS duration,
-            profile_id0,
-            profile_id1,
-            rating_0 - rating_0_prv AS diff0,
-            rating_1 - rating_1_prv AS diff1,
-            p0.profile_name AS p0_name,
-            p1.profile_name AS p1_name,
-            p0.banned AS p0_banned,
-            p1.banned AS p1_banned,
-            map_title
-        FROM outcomes o
-        LEFT JOIN players p0 ON p0.profile_id = o.profile_id0
-        LEFT JOIN players p1 ON p1.profile_id = o.profile_id1
-        WHERE :pid in (o.profile_id0, o.profile_id1)
-        ORDER BY o.end_time DESC
-        ''',
-        dict(pid=profile_id)
-    )
+    dt_params = _get_datatables_params()
+
+    # The games of the banned players are not displayed
+    player = db.execute('SELECT banned FROM players WHERE profile_id=:pid', dict(pid=profile_id)).fetchone()
+    if player is None or player['banned']:
+        return jsonify(dict(draw=dt_params['draw'], recordsTotal=0, recordsFiltered=0, data=[]))
+
+    response, matches = _get_games_page(db, dt_params, _player_outcomes, dict(pid=profile_id))
+
     games = []
-    for match in cur:
+    for match in matches:
         if match['profile_id0'] == profile_id:
             diff = match['diff0']
             opponent = escape(match['p1_name'])
             opponent_id = match['profile_id1']
             opponent_banned = match['p1_banned']
-            banned = match['p0_banned']
             outcome = 'Won'
         elif match['profile_id1'] == profile_id:
             diff = match['diff1']
             opponent = escape(match['p0_name'])
             opponent_id = match['profile_id0']
             opponent_banned = match['p0_banned']
-            banned = match['p1_banned']
             outcome = 'Lost'
         else:
             continue  # XXX shouldn't happen, assert?
-        if banned:
-            break
         game = dict(
             date=match['end_time'],
             opponent=dict(
@@ -476,9 +522,9 @@ def player_games_js(profile_id):
             ) if not opponent_banned else None,
         )
         games.append(game)
-    cur.close()
 
-    return jsonify(games)
+    response['data'] = games
+    return jsonify(response)
 
 
 @app.route('/player/<int:profile_id>')
@@ -497,8 +543,8 @@ def player(profile_id):
         player=player,
         ajax_url=ajax_url,
         rating_stats=_get_player_ratings(db, profile_id),
-        faction_stats=_get_player_faction_stats(db, profile_id),
-        map_stats=_get_player_map_stats(db, profile_id),
+        faction_stats=_get_player_faction_stats(player),
+        map_stats=_get_player_map_stats(player),
     )
 
 
@@ -511,14 +557,9 @@ def _get_colors(n):
 
 
 def _get_global_faction_stats(db):
-    hist = {}
-
-    # XXX: clumsy, patch welcome
-    for i in range(2):
-        cur = db.execute(f'SELECT COUNT(*) AS count, selected_faction_{i} AS faction FROM outcomes GROUP BY selected_faction_{i}')
-        hist.update({r['faction']: r['count'] for r in cur})
-        cur.close()
-    hist = hist.items()
+    cur = db.execute('SELECT faction, count FROM stats_factions ORDER BY faction')
+    hist = [(r['faction'], r['count']) for r in cur]
+    cur.close()
 
     if not hist:
         return [], [], []
@@ -534,7 +575,7 @@ def _get_global_faction_stats(db):
 
 
 def _get_global_map_stats(db):
-    cur = db.execute('SELECT COUNT(*) AS count, map_title FROM outcomes GROUP BY map_title')
+    cur = db.execute('SELECT map_title, count FROM stats_maps ORDER BY map_title')
     hist = [(r['map_title'], r['count']) for r in cur]
     cur.close()
 
@@ -552,24 +593,17 @@ def _get_global_map_stats(db):
 
 
 def _get_activity_stats(db):
-    cur = db.execute('''
-        SELECT
-            date(end_time) as date,
-            COUNT(*) as count
-        FROM outcomes
-        GROUP BY date
-        ORDER BY date ASC'''
-    )
-    outcomes_per_day = cur.fetchall()
-    if not outcomes_per_day:
+    cur = db.execute('SELECT date, count FROM stats_daily_activity ORDER BY date')
+    records = {r['date']: r['count'] for r in cur}
+    cur.close()
+    if not records:
         return dict(dates=None, data=None, games_per_day=0)
 
-    start_date = date.fromisoformat(outcomes_per_day[0]['date'])
-    end_date = date.today()
-    nb_days = (end_date - start_date).days
-    all_days = [(start_date + timedelta(n)).strftime('%Y-%m-%d') for n in range(nb_days + 1)]
-    db_records = {o['date']: o['count'] for o in outcomes_per_day}
-    records = {d: db_records.get(d, 0) for d in all_days}
+    # The days since the last update of the database
+    last_date = date.fromisoformat(max(records))
+    nb_days = (date.today() - last_date).days
+    for n in range(1, nb_days + 1):
+        records[(last_date + timedelta(n)).strftime('%Y-%m-%d')] = 0
 
     return dict(
         dates=list(records.keys()),
@@ -582,19 +616,8 @@ def _get_activity_stats(db):
 def globalstats():
     db = _db_get()
 
-    cur = db.execute('''
-        SELECT
-            COUNT(*) AS nb_games,
-            strftime('%M:%S', AVG(julianday(end_time) - julianday(start_time))) AS avg_duration
-        FROM outcomes'''
-    )
-    data = cur.fetchone()
-    nb_games = data['nb_games']
-    avg_duration = data['avg_duration']
-    cur.close()
-
-    cur = db.execute('SELECT COUNT(*) AS nb_players FROM players WHERE NOT banned')
-    nb_players = cur.fetchone()['nb_players']
+    cur = db.execute('SELECT nb_games, nb_players, avg_duration FROM stats_summary')
+    summary = cur.fetchone()
     cur.close()
 
     menu = _get_menu()
@@ -604,9 +627,9 @@ def globalstats():
         faction_stats=_get_global_faction_stats(db),
         map_stats=_get_global_map_stats(db),
         activity_stats=_get_activity_stats(db),
-        nb_games=nb_games,
-        nb_players=nb_players,
-        avg_duration=avg_duration,
+        nb_games=summary['nb_games'] if summary else 0,
+        nb_players=summary['nb_players'] if summary else 0,
+        avg_duration=summary['avg_duration'] if summary else None,
     )
 
 
@@ -37,6 +37,10 @@ function rating_render(data, type, row, meta) {
 	return data.value + ' ' + get_diff_html(data.diff)
 }
 
+function rank_render(data, type, row, meta) {
+	return data.value + ' ' + get_diff_html(data.diff)
+}
+
 function winrate_render(data, type, row, meta) {
 	return data.toFixed(1) + '%'
 }
@@ -44,3 +48,21 @@ function winrate_render(data, type, row, meta) {
 function outcome_render(data, type, row, meta) {
 	return data.desc + ' ' + get_diff_html(data.diff)
 }
+
+// Keyset pagination of the server-side games tables: when moving to the
+// next or previous page, the key of the last or first game of the current
+// page is sent along, so that the server doesn't have to skip all the games
+// before the requested page
+function games_page_data(data, settings) {
+	var page = settings.json ? settings.json.page : undefined
+	if (page == undefined || data.length != page.length || data.search.value.trim() != page.search ||
+	    (data.order[0].dir != 'asc') != page.descending)
+		return
+	if (data.start == page.start + page.length) {
+		data.after_end_time = page.last[0]
+		data.after_hash = page.last[1]
+	} else if (data.start == page.start - page.length) {
+		data.before_end_time = page.first[0]
+		data.before_hash = page.first[1]
+	}
+}
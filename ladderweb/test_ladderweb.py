@@ -0,0 +1,250 @@
+import json
+import os.path as op
+import re
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import laddertools
+import ladderweb
+from laddertools.stats import update_global_stats, update_player_stats
+from . import app
+
+
+# Profile id, name, banned, previous rating and rank, rating and rank
+_players = [
+    (1001, 'alice', 0, 1000, 2, 1100, 1),
+    (1002, 'bob', 0, 1010, 1, 1050, 2),
+    (1003, 'carol', 0, 1000, 2, 1100, 1),
+    (1004, 'mallory', 1, 1000, None, 1200, None),
+]
+
+
+def _create_db(path):
+    conn = sqlite3.connect(path)
+    with open(op.join(op.dirname(laddertools.__file__), 'ladder.sql')) as f:
+        conn.executescript(f.read())
+    outcomes = []
+    start = datetime(2021, 3, 1, 12)
+    for i in range(25):
+        p0, p1 = _players[i % 4][0], _players[(i + 1 + i // 4) % 4][0]
+        if p0 == p1:
+            p1 = _players[(i + 2) % 4][0]
+        # Some games end at the same time
+        end_time = start + timedelta(hours=i // 3 * 2, minutes=15)
+        outcomes.append((
+            f'{i:064x}',
+            (end_time - timedelta(minutes=15)).strftime('%Y-%m-%d %H:%M:%S'),
+            end_time.strftime('%Y-%m-%d %H:%M:%S'),
+            f'/replays/{i}.orarep',
+            p0, p1,
+            1000, 1000, 1000 + i, 1000 - i,
+            'soviet', 'allies', 'soviet', 'allies',
+            'uid', 'Map A' if i % 2 else 'Map B',
+        ))
+    conn.executemany('INSERT INTO outcomes VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', outcomes)
+    conn.executemany('INSERT INTO players VALUES (?,?,?,?,?,?,?,?,?,?)', [
+        (pid, name, '', banned, sum(o[4] == pid for o in outcomes), sum(o[5] == pid for o in outcomes),
+         prv_rating, rating, prv_rank, rank)
+        for pid, name, banned, prv_rating, prv_rank, rating, rank in _players
+    ])
+    update_global_stats(conn)
+    update_player_stats(conn)
+    conn.commit()
+    conn.close()
+    return outcomes
+
+
+@pytest.fixture
+def outcomes(tmp_path, monkeypatch):
+    outcomes = _create_db(str(tmp_path / 'db-ra-2m.sqlite3'))
+    monkeypatch.setattr(app, 'instance_path', str(tmp_path))
+    return outcomes
+
+
+def _sorted(outcomes, descending=True):
+    return sorted(outcomes, key=lambda o: (o[2], o[0]), reverse=descending)
+
+
+def _get(url, **params):
+    with app.test_client() as client:
+        response = client.get(url, query_string=params)
+        assert response.status_code == 200
+        return response.get_json()
+
+
+@pytest.mark.parametrize('direction', ['desc', 'asc'])
+def test_latest_games_pages(outcomes, direction):
+    hashes = []
+    for draw, start in enumerate(range(0, 30, 10), 1):
+        page = _get('/latest-js', draw=draw, start=start, length=10, **{'order[0][dir]': direction})
+        assert page['draw'] == draw
+        assert page['recordsTotal'] == page['recordsFiltered'] == 25
+        hashes += [game['replay']['hash'] if game['replay'] else None for game in page['data']]
+    expected = _sorted(outcomes, direction == 'desc')
+    banned = {pid for pid, _, banned, *_ in _players if banned}
+    assert hashes == [None if o[4] in banned or o[5] in banned else o[0] for o in expected]
+    assert len(_get('/latest-js', start=40, length=10)['data']) == 0
+
+
+def _page_hashes(page):
+    return [game['replay']['hash'] if game['replay'] else None for game in page['data']]
+
+
+@pytest.mark.parametrize('direction', ['desc', 'asc'])
+@pytest.mark.parametrize('search', ['', 'map a'])
+def test_latest_games_keyset(outcomes, direction, search):
+    params = {'order[0][dir]': direction, 'search[value]': search, 'length': 4}
+    expected = [_get('/latest-js', start=start, **params) for start in range(0, 28, 4)]
+
+    expected = [page for page in expected if page['data']]
+    assert len(expected) > 2
+
+    # Walk forward then backward with the keys of the pages
+    page = expected[0]
+    for n in range(1, len(expected)):
+        last_end_time, last_hash = page['page']['last']
+        page = _get('/latest-js', start=n * 4, after_end_time=last_end_time, after_hash=last_hash, **params)
+        assert page['data'] == expected[n]['data']
+    for n in range(len(expected) - 2, -1, -1):
+        first_end_time, first_hash = page['page']['first']
+        page = _get('/latest-js', start=n * 4, before_end_time=first_end_time, before_hash=first_hash, **params)
+        assert page['data'] == expected[n]['data']
+
+
+def test_latest_games_search(outcomes):
+    page = _get('/latest-js', start=0, length=100, **{'search[value]': 'map a'})
+    assert page['recordsTotal'] == 25
+    assert page['recordsFiltered'] == 12
+    assert {game['map'] for game in page['data']} == {'Map A'}
+
+    page = _get('/latest-js', start=5, length=100, **{'search[value]': 'carol'})
+    expected = [o for o in _sorted(outcomes) if 1003 in o[4:6]]
+    assert page['recordsFiltered'] == len(expected)
+    assert [game['date'] for game in page['data']] == [o[2] for o in expected[5:]]
+
+    # The LIKE wildcards are searched literally
+    assert _get('/latest-js', **{'search[value]': '%'})['recordsFiltered'] == 0
+
+
+def test_player_games(outcomes):
+    expected = [o for o in _sorted(outcomes) if 1001 in o[4:6]]
+    page = _get('/player-games-js/1001', draw=3, start=2, length=4)
+    assert page['draw'] == 3
+    assert page['recordsTotal'] == page['recordsFiltered'] == len(expected)
+    assert [game['date'] for game in page['data']] == [o[2] for o in expected[2:6]]
+    assert [game['outcome']['desc'] for game in page['data']] == [
+        'Won' if o[4] == 1001 else 'Lost' for o in expected[2:6]
+    ]
+
+    # Games of a banned player
+    page = _get('/player-games-js/1004')
+    assert page['recordsTotal'] == 0
+    assert page['data'] == []
+
+
+def test_globalstats(outcomes):
+    with app.test_request_context('/globalstats'):
+        db = ladderweb._db_get()
+        assert ladderweb._get_global_faction_stats(db)['total'] == 2 * len(outcomes)
+        assert ladderweb._get_global_map_stats(db)['names'] == ['Map A', 'Map B']
+        activity = ladderweb._get_activity_stats(db)
+        assert sum(activity['data']) == len(outcomes)
+        assert activity['dates'][0] == '2021-03-01'
+
+
+def test_player_stats(outcomes):
+    games = [o for o in outcomes if 1001 in o[4:6]]
+    with app.test_request_context('/player/1001'):
+        db = ladderweb._db_get()
+        player = ladderweb._get_player_info(db, 1001)
+        assert player['avg_game_duration'] == '15:00'
+
+        factions = ladderweb._get_player_faction_stats(player)
+        assert factions['total'] == len(games)
+        assert dict(zip(factions['names'], factions['data'])) == {
+            'soviet': sum(o[4] == 1001 for o in games),
+            'allies': sum(o[5] == 1001 for o in games),
+        }
+
+        maps = ladderweb._get_player_map_stats(player)
+        assert maps['names'] == ['Map A', 'Map B']
+        for map_title, wins, losses in zip(maps['names'], maps['win_data'], maps['loss_data']):
+            assert wins == sum(o[4] == 1001 and o[15] == map_title for o in games)
+            assert losses == -sum(o[5] == 1001 and o[15] == map_title for o in games)
+
+        # The first games are not part of the rating evolution
+        ratings = json.loads(ladderweb._get_player_ratings(db, 1001)['data'])
+        assert len(ratings) == 50
+        assert ratings[0] == [o[8] if o[4] == 1001 else o[9] for o in _sorted(games, False)][10]
+        assert ladderweb._get_player_info(db, 1004) is None
+
+
+def test_ranks(outcomes):
+    leaderboard = _get('/leaderboard-js')
+    assert [(row['player']['name'], row['rank']) for row in leaderboard] == [
+        ('alice', dict(value=1, diff=1)),
+        ('carol', dict(value=1, diff=1)),
+        ('bob', dict(value=2, diff=-1)),
+    ]
+
+    # The profiles show the same ranks as the leaderboard
+    with app.test_request_context('/player/1001'):
+        db = ladderweb._db_get()
+        for pid, name, banned, _, _, _, rank in _players:
+            player = ladderweb._get_player_info(db, pid)
+            assert player['rank'] == rank if not banned else player is None
+
+
+class _RecordingConnection:
+    """Records the queries made through an SQLite connection."""
+
+    def __init__(self, conn, queries):
+        self._conn = conn
+        self._queries = queries
+
+    def execute(self, sql, params=()):
+        self._queries.append((sql, params))
+        return self._conn.execute(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _full_scans(conn, sql, params):
+    plan = [detail for _, _, _, detail in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+    # A "SCAN <table>" reads the whole table, even through a (non covering)
+    # index, while the scans of a covering index or a subquery are fine
+    subqueries = {m.group(2) for m in (re.fullmatch(r'(CO-ROUTINE|MATERIALIZE) (\S+)', d) for d in plan) if m}
+    return [
+        d for d in plan
+        if re.fullmatch(r'SCAN \w+( USING INDEX \w+)?', d) and d.split()[1] not in subqueries
+    ]
+
+
+def test_query_plans(outcomes, tmp_path, monkeypatch):
+    queries = []
+    db_get = ladderweb._db_get
+    monkeypatch.setattr(ladderweb, '_db_get', lambda: _RecordingConnection(db_get(), queries))
+
+    _get('/leaderboard-js')
+    _get('/latest-js', start=10, length=10)
+    _get('/latest-js', start=0, length=10, **{'order[0][dir]': 'asc'})
+    first_page = _get('/latest-js', start=0, length=10)['page']
+    _get('/latest-js', start=10, length=10, after_end_time=first_page['last'][0], after_hash=first_page['last'][1])
+    _get('/latest-js', start=0, length=10, before_end_time=first_page['last'][0], before_hash=first_page['last'][1])
+    _get('/player-games-js/1001', start=2, length=4)
+    player_page = _get('/player-games-js/1001', start=0, length=4)['page']
+    _get('/player-games-js/1001', start=4, length=4, after_end_time=player_page['last'][0],
+         after_hash=player_page['last'][1])
+    with app.test_request_context('/player/1001'):
+        db = ladderweb._db_get()
+        ladderweb._get_player_info(db, 1001)
+        ladderweb._get_player_ratings(db, 1001)
+    assert len(queries) >= 20
+
+    conn = sqlite3.connect(str(tmp_path / 'db-ra-2m.sqlite3'))
+    for sql, params in queries:
+        assert not _full_scans(conn, sql, params), sql
+    conn.close()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+# Memory benchmark of the ladder computation on a random series of games,
+# with the current player, outcome, result and rating objects against the
+# layout they had before: outcomes keeping the four rating objects of their
+# players (and all the fields of the row), and all the classes backed by a
+# __dict__:
+#
+#   python misc/bench-ladder-memory.py [nb_games] [nb_players] [ranking]
+#
+
+import sys
+import random
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from laddertools import ladder, replay
+from laddertools.ranking import ranking_systems
+from laddertools.rankings import elo, glicko, trueskill, trueskill1v1
+
+_Player = ladder._Player
+_OutCome = ladder._OutCome
+
+
+class _BaselinePlayer:
+
+    def __init__(self, rankings, profile_id, name, avatar_url, banned=False):
+        ranking, *extra_rankings = rankings
+        self.profile_id = profile_id
+        self.name = name
+        self.wins = 0
+        self.losses = 0
+        self.prv_rating = ranking.get_default_rating()
+        self.rating = ranking.get_default_rating()
+        self.extra_ratings = [[r.get_default_rating().display_value] * 2 for r in extra_rankings]
+        self.avatar_url = avatar_url
+        self.banned = banned
+
+    update_rating = _Player.update_rating
+
+
+class _BaselineOutCome:
+
+    def __init__(self, result, p0, p1):
+        self._hash = _OutCome.get_hash(result)
+        self._filename = result.filename
+        self._start_time = result.start_time
+        self._end_time = result.end_time
+        self._p0_profile_id = p0.profile_id
+        self._p1_profile_id = p1.profile_id
+        self._p0_rating0 = p0.prv_rating
+        self._p1_rating0 = p1.prv_rating
+        self._p0_rating1 = p0.rating
+        self._p1_rating1 = p1.rating
+        self._p0_faction = result.player0.faction
+        self._p1_faction = result.player1.faction
+        self._p0_selected_faction = result.player0.selected_faction
+        self._p1_selected_faction = result.player1.selected_faction
+        self._map_uid = result.map_uid
+        self._map_title = result.map_title
+        self._extra_ratings = tuple(
+            value
+            for (p0_rating0, p0_rating1), (p1_rating0, p1_rating1) in zip(p0.extra_ratings, p1.extra_ratings)
+            for value in (p0_rating0, p1_rating0, p0_rating1, p1_rating1)
+        )
+
+    @property
+    def sql_row(self):
+        fmt = _OutCome._sql_date_fmt
+        return (
+            self._hash,
+            fmt(self._start_time),
+            fmt(self._end_time),
+            self._filename,
+            self._p0_profile_id,
+            self._p1_profile_id,
+            self._p0_rating0.display_value,
+            self._p1_rating0.display_value,
+            self._p0_rating1.display_value,
+            self._p1_rating1.display_value,
+            self._p0_faction,
+            self._p1_faction,
+            self._p0_selected_faction,
+            self._p1_selected_faction,
+            self._map_uid,
+            self._map_title,
+            *self._extra_ratings,
+        )
+
+
+# The other classes only lost their __dict__
+_slotted_classes = (
+    (ladder, '_Game'),
+    (replay, 'GameResult'),
+    (replay, 'GamePlayerInfo'),
+    (ladder, 'GameResult'),
+    (ladder, 'GamePlayerInfo'),
+    (elo, '_RatingELO'),
+    (glicko, '_RatingGlicko'),
+    (trueskill, '_RatingTrueskill'),
+    (trueskill1v1, '_RatingTrueskill1v1'),
+)
+
+
+def _dict_backed(cls):
+    attrs = {k: v for k, v in vars(cls).items() if k != '__slots__' and k not in cls.__slots__}
+    return type(cls.__name__, cls.__bases__, attrs)
+
+
+@contextmanager
+def _baseline_layout():
+    names = [(ladder, '_Player'), (ladder, '_OutCome'), *_slotted_classes]
+    saved = [(module, name, getattr(module, name)) for module, name in names]
+    # Some classes are imported in several modules
+    replacements = {cls: _dict_backed(cls) for module, name, cls in saved[2:]}
+    replacements[_Player] = _BaselinePlayer
+    replacements[_OutCome] = _BaselineOutCome
+    for module, name, cls in saved:
+        setattr(module, name, replacements[cls])
+    try:
+        yield
+    finally:
+        for module, name, cls in saved:
+            setattr(module, name, cls)
+
+
+def _get_games(nb_games, nb_players):
+    rng = random.Random(0)
+    return [rng.sample(range(nb_players), 2) for _ in range(nb_games)]
+
+
+def _build(games, nb_players, ranking):
+    accounts_db = {f'fp{i}': (1000 + i, f'player{i}', '') for i in range(nb_players)}
+    start = datetime(2021, 1, 1)
+    results = []
+    for i, (w, l) in enumerate(games):
+        start_time = start + timedelta(minutes=i * 20)
+        results.append(replay.GameResult(
+            start_time,
+            start_time + timedelta(minutes=15),
+            f'/replays/replay-{i:06d}.orarep',
+            replay.GamePlayerInfo(f'fp{w}', f'player{w}', 'soviet', 'Random'),
+            replay.GamePlayerInfo(f'fp{l}', f'player{l}', 'allies', 'allies'),
+            'map-uid',
+            'Map title',
+        ))
+    players, outcomes, states = ladder._get_players_outcomes(accounts_db, results, [ranking_systems[ranking]()])
+    return results, players, outcomes, states
+
+
+def _measure(games, nb_players, ranking):
+    tracemalloc.start()
+    data = _build(games, nb_players, ranking)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rows = [o.sql_row for o in data[2]]
+    return current, peak, rows
+
+
+def main(nb_games=100000, nb_players=2000, ranking='trueskill'):
+    nb_games, nb_players = int(nb_games), int(nb_players)
+    games = _get_games(nb_games, nb_players)
+
+    with _baseline_layout():
+        ref_current, ref_peak, ref_rows = _measure(games, nb_players, ranking)
+    current, peak, rows = _measure(games, nb_players, ranking)
+    assert rows == ref_rows
+
+    print(f'{nb_games} games, {nb_players} players, {ranking}')
+    for name, c, p in (('baseline', ref_current, ref_peak), ('current', current, peak)):
+        print(f'{name:>8}: retained {c / 2**20:7.1f} MiB ({c / nb_games:5.0f} B/game), peak {p / 2**20:7.1f} MiB')
+    print(f'reduction: retained {1 - current / ref_current:.0%}, peak {1 - peak / ref_peak:.0%}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
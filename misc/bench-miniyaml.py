@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+#
+# Benchmark of laddertools.miniyaml.load() against the previous regex based
+# implementation, and of the extraction of the replay game information, using
+# the metadata blocks of real replays:
+#
+#   python misc/bench-miniyaml.py ~/.config/openra/Replays/ra
+#
+
+import re
+import sys
+import struct
+import timeit
+
+from laddertools import miniyaml
+from laddertools.replay import _game_info_paths
+from laddertools.utils import get_replay_files
+
+
+_LINE_RE = re.compile(r'^(?P<indent>\t*)(?:(?P<key>[^:]*):\s*)?(?P<value>.*)')
+
+
+def _cleanup(d):
+    if d == {}:
+        return ''
+    for k, v in d.items():
+        if not isinstance(v, dict):
+            continue
+        d[k] = _cleanup(d[k])
+    return d
+
+
+def load_regex(yaml_str):
+    yaml_str = str(yaml_str, 'utf-8')
+    levels = [{}]
+    for line in yaml_str.splitlines():
+        m = re.match(_LINE_RE, line)
+        indent, key, value = m.group('indent', 'key', 'value')
+        level = len(indent)
+        if not key:
+            continue
+        if not value:
+            value = {}
+            levels = levels[:level + 1] + [value]
+        parent = levels[level]
+        parent[key] = value
+    return _cleanup(levels[0])
+
+
+def _read_metadata_block(filename):
+    with open(filename, 'rb') as f:
+        f.seek(-8, 2)
+        length, end_marker = struct.unpack('<ii', f.read(8))
+        if end_marker != -2:
+            return None
+        f.seek(-(length + 4), 1)
+        return f.read(length - 4)
+
+
+def main(replays):
+    blocks = [_read_metadata_block(fn) for fn in get_replay_files(replays) if fn.endswith('.orarep')]
+    blocks = [b for b in blocks if b]
+    if not blocks:
+        sys.exit('no replay metadata block found')
+
+    for block in blocks:
+        assert miniyaml.load(block) == load_regex(block)
+
+    nb_bytes = sum(len(b) for b in blocks)
+    print(f'{len(blocks)} metadata blocks, {nb_bytes / len(blocks):.0f} bytes on average')
+
+    def extract(block):
+        return miniyaml.extract(block, _game_info_paths)
+
+    for name, load in (('regex', load_regex), ('miniyaml', miniyaml.load), ('extract', extract)):
+        number = max(1, 20000 // len(blocks))
+        t = min(timeit.repeat(lambda: [load(b) for b in blocks], number=number, repeat=5))
+        per_block = t / (number * len(blocks))
+        print(f'{name:>10}: {per_block * 1e6:7.2f} us/block, {nb_bytes * number / t / 1e6:6.1f} MB/s')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+#
+# Benchmark of the closed form TrueSkill 1v1 backend against the trueskill
+# package, on a random series of games:
+#
+#   python misc/bench-trueskill.py [nb_games] [nb_players]
+#
+
+import sys
+import random
+import timeit
+
+from laddertools.rankings.trueskill import RankingTrueskill
+from laddertools.rankings.trueskill1v1 import RankingTrueskill1v1
+
+
+def _get_games(nb_games, nb_players):
+    rng = random.Random(0)
+    return [rng.sample(range(nb_players), 2) for _ in range(nb_games)]
+
+
+def _rate(ranking, games, nb_players):
+    ratings = [ranking.get_default_rating() for _ in range(nb_players)]
+    for w, l in games:
+        ratings[w], ratings[l] = ranking.record_result(ratings[w], ratings[l])
+    return ratings
+
+
+def main(nb_games=20000, nb_players=500):
+    games = _get_games(nb_games, nb_players)
+
+    ref = _rate(RankingTrueskill(), games, nb_players)
+    fast = _rate(RankingTrueskill1v1(), games, nb_players)
+    max_diff = max(abs(a - b) for r, f in zip(ref, fast) for a, b in zip(r.state, f.state))
+    nb_display_diffs = sum(r.display_value != f.display_value for r, f in zip(ref, fast))
+    print(f'{nb_games} games, {nb_players} players: max state difference {max_diff:.2g}, '
+          f'{nb_display_diffs} different display values')
+
+    for name, ranking in (('trueskill', RankingTrueskill()), ('trueskill1v1', RankingTrueskill1v1())):
+        t = min(timeit.repeat(lambda: _rate(ranking, games, nb_players), number=1, repeat=3))
+        print(f'{name:>12}: {t / nb_games * 1e6:7.2f} us/game, {nb_games / t:9.0f} games/s')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
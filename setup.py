@@ -16,11 +16,22 @@ setup(
     ],
     entry_points=dict(
         console_scripts=[
+            'ora-backtest = laddertools.backtest:run',
             'ora-ladder = laddertools.ladder:run',
             'ora-mapstool = laddertools.mapstool:run',
             'ora-ragl   = laddertools.ragl:run',
             'ora-replay = laddertools.replay:run',
             'ora-srvwrap  = laddertools.srvwrap:run',
         ],
+        # Ranking systems available to ora-ladder --ranking, other packages
+        # can register their own
+        **{
+            'oraladder.rankings': [
+                'trueskill    = laddertools.rankings.trueskill:RankingTrueskill',
+                'trueskill1v1 = laddertools.rankings.trueskill1v1:RankingTrueskill1v1',
+                'elo          = laddertools.rankings.elo:RankingELO',
+                'glicko       = laddertools.rankings.glicko:RankingGlicko',
+            ],
+        },
     ),
 )